@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+"""
+BFV2 Theme 05 - Genomics - Sequencing Project
+
+Persistent cache of parsed ANNOVAR tables.
+
+A parsed table (the selected columns of an ANNOVAR file) is written to a
+binary, columnar cache file. Every column is stored dictionary encoded:
+the distinct values (as one UTF-8 blob with offsets) and a code per row.
+The cache file is memory mapped when it is read, values are only decoded
+when they are used, so an unchanged file can be used again without
+parsing it.
+
+A cache file belongs to the path of the ANNOVAR file and a key for the
+parsed columns, and is only used if the size, modification time and a
+hash of sampled content of the ANNOVAR file did not change. When the
+cache directory grows beyond its maximum size, the least recently used
+cache files are removed.
+
+    usage:
+        python3 annovar_cache.py [-d cache_dir] [-m max_size_mb] [--clear]
+"""
+
+# METADATA VARIABLES
+__author__ = "Micha Beens, Nadia Choudhury"
+__status__ = "Finished"
+__version__ = "2019.ac.v1"
+
+# IMPORT
+import sys
+import os
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+from array import array
+
+CACHE_DIR = os.environ.get('ANNOVAR_CACHE_DIR', '.annovar_cache')
+CACHE_EXTENSION = '.anc'
+# Maximum size of all cache files together, in bytes
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+# Size and number of the blocks read for the content hash
+SAMPLE_SIZE = 65536
+SAMPLES = 8
+
+MAGIC = b'ANNOVARC'
+VERSION = 1
+# Magic, version and length of the JSON header
+HEADER_FORMAT = '<8sII'
+
+
+# FUNCTIONS
+def fingerprint(filename):
+    """
+    Returns the fingerprint of a file, a hash of its size, modification time
+    and a number of blocks spread over its content
+
+    Args:
+        filename (String): The filename of the file
+    Return:
+        (String): The fingerprint as a hexadecimal string
+    """
+    stat = os.stat(filename)
+    digest = hashlib.sha1('{}\t{}'.format(stat.st_size, stat.st_mtime_ns).encode())
+
+    with open(filename, 'rb') as file_data:
+        for sample in range(SAMPLES):
+            file_data.seek(max(stat.st_size - SAMPLE_SIZE, 0) * sample // (SAMPLES - 1))
+            digest.update(file_data.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def cache_filename(filename, key, cache_dir=CACHE_DIR):
+    """
+    Returns the cache filename for a parsed file, made of a hash of the path
+    and key and the fingerprint of the file
+
+    Args:
+        filename (String): The filename of the ANNOVAR file
+        key (String): Describes how the file is parsed (e.g. the columns)
+        cache_dir (String): The cache directory
+    Return:
+        (String): The filename of the cache file
+    """
+    source = hashlib.sha1('{}\t{}'.format(os.path.abspath(filename), key).encode())
+    return os.path.join(cache_dir, '{}-{}{}'.format(source.hexdigest()[:16],
+                                                   fingerprint(filename)[:24],
+                                                   CACHE_EXTENSION))
+
+
+class CachedColumn:
+    """
+    A read-only column of a memory mapped cache file, values are decoded
+    when they are requested. The decoded values of columns with repeating
+    values are kept, so every distinct value is decoded only once.
+    """
+
+    def __init__(self, codes, offsets, blob):
+        self.codes = codes
+        self.offsets = offsets
+        self.blob = blob
+        # Keep decoded values if values repeat
+        self.values = {} if 2 * (len(offsets) - 1) <= len(codes) else None
+
+    def value(self, code):
+        """ Returns the distinct value with the given code """
+        if self.values is not None and code in self.values:
+            return self.values[code]
+        value = str(self.blob[self.offsets[code]:self.offsets[code + 1]], 'utf-8')
+        if self.values is not None:
+            self.values[code] = value
+        return value
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.value(code) for code in self.codes[index]]
+        return self.value(self.codes[index])
+
+    def __iter__(self):
+        value = self.value
+        for code in self.codes:
+            yield value(code)
+
+
+def _encode_column(values):
+    """ Dictionary encodes a column: returns the codes, offsets and blob """
+    distinct = {}
+    codes = array('I', [distinct.setdefault(value, len(distinct)) for value in values])
+    encoded = [value.encode() for value in distinct]
+
+    offsets = array('Q', [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return codes, offsets, b''.join(encoded)
+
+
+def write_cache(cache_file, names, columns):
+    """
+    Writes the columns of a parsed table to a cache file. The file is
+    written under a temporary name first, so a cache file is never
+    incomplete.
+
+    Args:
+        cache_file (String): The filename of the cache file
+        names (List): The names of the columns
+        columns (List): Per column a list with the (string) values
+    """
+    sections = []
+    header = {'names': list(names), 'rows': len(columns[0]) if columns else 0, 'columns': []}
+    position = 0
+    for values in columns:
+        column = {}
+        for part, data in zip(('codes', 'offsets', 'blob'), _encode_column(values)):
+            data = bytes(data)
+            # Keep every part aligned for the typed memory views
+            padding = -position % 8
+            sections.append(b'\0' * padding + data)
+            position += padding
+            column[part] = [position, len(data)]
+            position += len(data)
+        header['columns'].append(column)
+
+    header_data = json.dumps(header).encode()
+    header_size = struct.calcsize(HEADER_FORMAT) + len(header_data)
+    header_data += b' ' * (-header_size % 8)
+
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    temp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with open(temp_file, 'wb') as output:
+        output.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(header_data)))
+        output.write(header_data)
+        output.writelines(sections)
+    os.replace(temp_file, cache_file)
+
+
+def read_cache(cache_file):
+    """
+    Memory maps a cache file
+
+    Args:
+        cache_file (String): The filename of the cache file
+    Return:
+        names (List): The names of the columns
+        columns (List): Per column a `CachedColumn`
+    Raises:
+        ValueError: If the file is not a valid cache file
+    """
+    with open(cache_file, 'rb') as file_data:
+        data = memoryview(mmap.mmap(file_data.fileno(), 0, access=mmap.ACCESS_READ))
+
+    magic, version, header_length = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a valid cache file'.format(cache_file))
+    start = struct.calcsize(HEADER_FORMAT)
+    header = json.loads(bytes(data[start:start + header_length]))
+    start += header_length
+
+    def part(column, name, type_code=None):
+        offset, length = column[name]
+        view = data[start + offset:start + offset + length]
+        return view.cast(type_code) if type_code else view
+
+    columns = [CachedColumn(part(column, 'codes', 'I'), part(column, 'offsets', 'Q'),
+                            part(column, 'blob'))
+               for column in header['columns']]
+    return header['names'], columns
+
+
+def cache_files(cache_dir=CACHE_DIR):
+    """
+    Lists the cache files in the cache directory
+
+    Args:
+        cache_dir (String): The cache directory
+    Return:
+        (List): A (filename, size, last use) tuple per cache file, the
+                least recently used first
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    files = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_EXTENSION):
+            stat = os.stat(os.path.join(cache_dir, name))
+            files.append((os.path.join(cache_dir, name), stat.st_size, stat.st_mtime))
+    return sorted(files, key=lambda cache_file: cache_file[2])
+
+
+def evict(cache_dir=CACHE_DIR, max_size=MAX_CACHE_SIZE, keep=None):
+    """
+    Removes the least recently used cache files until the cache directory
+    is not larger than `max_size`
+
+    Args:
+        cache_dir (String): The cache directory
+        max_size (Int): The maximum size of all cache files in bytes
+        keep (String): A cache file that is not removed
+    Return:
+        removed (List): The removed cache files
+    """
+    files = cache_files(cache_dir)
+    total = sum(size for _, size, _ in files)
+    removed = []
+    for cache_file, size, _ in files:
+        if total <= max_size:
+            break
+        if cache_file != keep:
+            os.remove(cache_file)
+            removed.append(cache_file)
+            total -= size
+    return removed
+
+
+def load_columns(filename, key, parse, cache_dir=CACHE_DIR, max_size=MAX_CACHE_SIZE):
+    """
+    Returns the parsed columns of an ANNOVAR file from the cache. If the file
+    is not in the cache (or changed) it is parsed, stored in the cache and
+    older cache files of the same file and key are removed.
+
+    Args:
+        filename (String): The filename of the ANNOVAR file
+        key (String): Describes how the file is parsed (e.g. the columns)
+        parse (Function): Parses the file, returns the names of the columns
+                          and per column a list with the (string) values
+        cache_dir (String): The cache directory
+        max_size (Int): The maximum size of the cache directory in bytes
+    Return:
+        names (List): The names of the columns
+        columns (List): Per column a sequence with the values
+    """
+    cache_file = cache_filename(filename, key, cache_dir)
+    if os.path.exists(cache_file):
+        try:
+            names, columns = read_cache(cache_file)
+            # Mark the cache file as recently used
+            os.utime(cache_file)
+            return names, columns
+        except (ValueError, struct.error):
+            os.remove(cache_file)
+
+    names, columns = parse()
+
+    # Remove the cache files of older versions of the file
+    prefix = os.path.basename(cache_file).split('-')[0] + '-'
+    for old_file, _, _ in cache_files(cache_dir):
+        if os.path.basename(old_file).startswith(prefix):
+            os.remove(old_file)
+
+    write_cache(cache_file, names, columns)
+    evict(cache_dir, max_size, keep=cache_file)
+    return names, columns
+
+
+# MAIN
+def main(args):
+    """ Main function that shows or clears the cache directory """
+    parser = argparse.ArgumentParser(description='Shows the ANNOVAR cache files, removes the '
+                                                 'least recently used files above the maximum '
+                                                 'size')
+    parser.add_argument('-d', '--cache_dir', type=str, default=CACHE_DIR,
+                        help='the cache directory (default: {})'.format(CACHE_DIR))
+    parser.add_argument('-m', '--max_size', type=int, default=MAX_CACHE_SIZE // 1024 ** 2,
+                        help='maximum size of the cache directory in MB')
+    parser.add_argument('--clear', action='store_true', help='remove all cache files')
+    args = parser.parse_args(args[1:])
+
+    removed = evict(args.cache_dir, 0 if args.clear else args.max_size * 1024 ** 2)
+    for cache_file in removed:
+        print('Removed', cache_file)
+
+    files = cache_files(args.cache_dir)
+    print(len(files), 'cache files using', round(sum(size for _, size, _ in files) / 1024 ** 2, 1),
+          'MB in', args.cache_dir)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
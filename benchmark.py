@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+"""
+BFV2 Theme 05 - Genomics - Sequencing Project
+
+Benchmark suite for the parsing pipeline of the deliverables.
+
+Realistic synthetic BED, pileup, VCF and ANNOVAR files of a configurable
+size are generated first (and reused when they already exist). Every
+benchmark then runs in its own process, so the peak memory use (RSS) of
+each benchmark can be measured. The throughput and peak RSS are written
+as JSON and can be compared against a stored baseline to find
+regressions.
+
+    usage:
+        python3 benchmark.py [-n lines] [-d data_dir] [-o results.json]
+                             [-b baseline.json] [-t tolerance] [benchmark ...]
+
+    output:
+        a JSON file with per benchmark the time, throughput and peak RSS.
+        The exit code is 1 if a benchmark failed or a regression against
+        the baseline is found.
+"""
+
+# METADATA VARIABLES
+__author__ = "Micha Beens, Nadia Choudhury"
+__status__ = "Finished"
+__version__ = "2019.bm.v1"
+
+# IMPORT
+import sys
+import os
+import io
+import re
+import json
+import time
+import random
+import argparse
+import resource
+import contextlib
+import multiprocessing
+from queue import Empty
+
+import deliverable4
+import deliverable5
+import deliverable6
+import deliverable7
+import deliverable9
+import gene_names
+
+# Exon layout of the generated data, about 30% of all positions are exonic
+EXON_LENGTH = 150
+INTRON_LENGTH = 350
+EXONS_PER_GENE = 10
+CHROMOSOMES = [str(number) for number in range(1, 23)] + ['X']
+
+# Raw RefSeq_Gene values as found in ANNOVAR files
+REFSEQ_GENES = [
+    'TNNI3(NM_000363:exon5:c.371+2T>A)',
+    'TSHZ3(dist=65732),THEG5(dist=173173)',
+    'ACTR3BP2(dist=138949),NONE(dist=NONE)',
+    'BIN1(dist=32600),CYP27C1(dist=43909)',
+    'LOC101927282(dist=1978702),LOC101927305(dist=14658)',
+    'NBPF10,NBPF20',
+    'ERBB4',
+    'LOC100507291',
+    'NONE'
+]
+
+
+# FUNCTIONS
+def annovar_header():
+    """
+    Returns the column names of a generated ANNOVAR file. The columns used
+    by deliverable 6 and 9 are at the same position as in the Galaxy
+    ANNOVAR output.
+    """
+    header = ['Column{}'.format(number) for number in range(54)]
+    named_columns = {0: 'Chromosome', 1: 'Begin', 2: 'End', 3: 'Reference', 4: 'Allele',
+                     8: 'Func', 9: 'RefSeq_Func', 10: 'RefSeq_Gene', 11: 'ExonicFunc',
+                     15: 'dbSNP138', 16: 'Func_refGene', 27: '1000g2015aug_EUR',
+                     30: 'LJB2_SIFT', 31: 'LJB2_PolyPhen2_HDIV', 53: 'CLINVAR'}
+    for number, name in named_columns.items():
+        header[number] = name
+    return header
+
+
+def generate_files(data_dir, lines, seed=2019):
+    """
+    Generates the synthetic data files, existing files are reused
+
+    Args:
+        data_dir (String): The directory to write the files to
+        lines (Int): The number of lines of the pileup, VCF and ANNOVAR files
+        seed (Int): The seed of the random generator
+    Return:
+        files (Dictionary): The filename of each generated file type
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    files = {file_type: os.path.join(data_dir, 'bench_{}.{}'.format(lines, file_type))
+             for file_type in ['bed', 'pileup', 'vcf', 'tabular']}
+    generators = {'bed': generate_bed, 'pileup': generate_pileup,
+                  'vcf': generate_vcf, 'tabular': generate_annovar}
+
+    for file_type, filename in files.items():
+        if not os.path.exists(filename):
+            print('Generating', filename)
+            generators[file_type](filename + '.tmp', lines, random.Random(seed))
+            os.replace(filename + '.tmp', filename)
+
+    return files
+
+
+def _chromosome_sizes(lines):
+    """ Divides `lines` positions over the chromosomes """
+    size = lines // len(CHROMOSOMES)
+    sizes = [size] * len(CHROMOSOMES)
+    sizes[-1] += lines - size * len(CHROMOSOMES)
+    return dict(zip(CHROMOSOMES, sizes))
+
+
+def generate_bed(filename, lines, _rng):
+    """
+    Writes a BED file with the exons covering about 30% of the positions
+    in the pileup file of the same number of lines
+    """
+    gene_nr = 0
+    with open(filename, 'w') as output:
+        for chrom, size in _chromosome_sizes(lines).items():
+            start = 1
+            exon_nr = 0
+            while start + EXON_LENGTH <= size:
+                if exon_nr % EXONS_PER_GENE == 0:
+                    gene_nr += 1
+                output.write('{}\t{}\t{}\tGENE{}\n'.format(chrom, start, start + EXON_LENGTH,
+                                                          gene_nr))
+                start += EXON_LENGTH + INTRON_LENGTH
+                exon_nr += 1
+
+
+def generate_pileup(filename, lines, rng):
+    """
+    Writes a coordinate-sorted pileup file with a line for every position
+    """
+    # Cache the read bases and qualities for every coverage value
+    reads = {}
+    with open(filename, 'w') as output:
+        for chrom, size in _chromosome_sizes(lines).items():
+            for pos in range(1, size + 1):
+                cov = min(int(rng.expovariate(1 / 60)), 400)
+                if cov not in reads:
+                    reads[cov] = ('.' * cov, 'I' * cov)
+                output.write('chr{}\t{}\t{}\t{}\t{}\t{}\n'.format(
+                    chrom, pos, rng.choice('ACGT'), cov, *reads[cov]))
+
+
+def generate_vcf(filename, lines, rng):
+    """
+    Writes a VarScan VCF file with a single sample
+    """
+    formats = ['GT:GQ:SDP:DP:RD:AD:FREQ:PVAL:RBQ:ABQ:RDF:RDR:ADF:ADR',
+               'GT:GQ:DP:FREQ']
+    with open(filename, 'w') as output:
+        output.write('##fileformat=VCFv4.1\n##source=VarScan2\n')
+        output.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSample1\n')
+        for chrom, size in _chromosome_sizes(lines).items():
+            pos = 0
+            for _ in range(size):
+                pos += rng.randint(1, 500)
+                form = rng.choice(formats).split(':')
+                values = [str(rng.randint(1, 200)) for _ in form]
+                values[0] = rng.choice(['0/1', '1/1'])
+                values[form.index('FREQ')] = '{:.2f}%'.format(rng.uniform(0, 100))
+                output.write('chr{}\t{}\t.\t{}\t{}\t.\tPASS\tADP={};WT=0;HET=1;HOM=0;NC=0\t'
+                             '{}\t{}\n'.format(chrom, pos, rng.choice('ACGT'), rng.choice('ACGT'),
+                                               rng.randint(1, 200), ':'.join(form),
+                                               ':'.join(values)))
+
+
+def generate_annovar(filename, lines, rng):
+    """
+    Writes an ANNOVAR tabular file with the header of `annovar_header`
+    """
+    header = annovar_header()
+    with open(filename, 'w') as output:
+        output.write('\t'.join(header) + '\n')
+        for chrom, size in _chromosome_sizes(lines).items():
+            pos = 0
+            for _ in range(size):
+                pos += rng.randint(1, 500)
+                row = [''] * len(header)
+                row[0] = 'chr' + chrom
+                row[1] = row[2] = str(pos)
+                row[3], row[4] = rng.choice('ACGT'), rng.choice('ACGT')
+                row[8] = row[9] = rng.choice(['exonic', 'intronic', 'UTR3', 'splicing'])
+                row[10] = rng.choice(REFSEQ_GENES)
+                row[11] = rng.choice(['synonymous SNV', 'nonsynonymous SNV', ''])
+                row[15] = rng.choice(['', 'rs{}'.format(rng.randint(1, 10 ** 8))])
+                row[27] = rng.choice(['', '{:.4f}'.format(rng.random())])
+                row[30] = rng.choice(['', '{:.2f}'.format(rng.random())])
+                row[31] = rng.choice(['', 'B', 'P', 'D'])
+                row[53] = rng.choice(['', 'CLINSIG=benign', 'CLINSIG=pathogenic'])
+                output.write('\t'.join(row) + '\n')
+
+
+# BENCHMARKS
+# Each benchmark gets the generated files, does its (untimed) setup and
+# returns the timed function and the number of processed lines.
+def bench_parse_bed_data(files):
+    """ deliverable4.parse_bed_data on the BED file """
+    bed_data = deliverable4.read_data(files['bed'])
+    return lambda: deliverable4.parse_bed_data(bed_data), len(bed_data), files['bed']
+
+
+def bench_parse_pileup_data(files):
+    """ deliverable4.parse_pileup_data streaming the pileup file """
+    bed_dict = deliverable4.parse_bed_data(deliverable4.read_data(files['bed']))
+    return (lambda: deliverable4.parse_pileup_data(
+        deliverable4.stream_data(files['pileup']), bed_dict, progress=False),
+            _count_lines(files['pileup']), files['pileup'])
+
+
+def bench_scan_pileup(files):
+    """ deliverable4.scan_pileup on the memory-mapped pileup file """
+    bed_dict = deliverable4.parse_bed_data(deliverable4.read_data(files['bed']))
+    return (lambda: deliverable4.scan_pileup(files['pileup'], bed_dict),
+            _count_lines(files['pileup']), files['pileup'])
+
+
+def bench_calculate_mapping_coverage(files):
+    """ deliverable4.calculate_mapping_coverage on the parsed pileup file """
+    bed_dict = deliverable4.parse_bed_data(deliverable4.read_data(files['bed']))
+    coverage_dict = deliverable4.scan_pileup(files['pileup'], bed_dict)
+    positions = sum(len(coverage) for coverage in coverage_dict.values())
+    return lambda: deliverable4.calculate_mapping_coverage(coverage_dict), positions, None
+
+
+def bench_parse_vcf_data(files):
+    """ deliverable5.parse_vcf_data on the VCF file """
+    output = files['vcf'] + '.out'
+    return (lambda: deliverable5.parse_vcf_data(files['vcf'], 30, output),
+            _count_lines(files['vcf']), files['vcf'])
+
+
+def bench_parse_annovar(files):
+    """ deliverable6.parse_annovar on the ANNOVAR file """
+    return (lambda: deliverable6.parse_annovar(files['tabular']),
+            _count_lines(files['tabular']), files['tabular'])
+
+
+def _legacy_get_gene_name(gene_name):
+    """ The gene name filter as it was before `gene_names`, compiling the
+    regular expression and searching every value """
+    reg_ex = r"((?=LOC)[A-Z0-9\-]+|(?=LIN)[A-Z0-9\-]+|NONE|\([^)]*\))?(?(1)|([A-Z0-9\-]+))"
+    match = [match.group(2)
+             for match in re.finditer(reg_ex, gene_name, re.IGNORECASE)
+             if match.group(2) != "" and match.group(2) is not None]
+    return "/".join(match) if match else "-"
+
+
+def _raw_genes(files):
+    """ Returns the RefSeq_Gene column of the ANNOVAR file """
+    gene_column = annovar_header().index('RefSeq_Gene')
+    with open(files['tabular']) as data:
+        next(data)
+        return [line.split('\t')[gene_column] for line in data]
+
+
+def bench_get_gene_name(files):
+    """ deliverable7.get_gene_name on the RefSeq_Gene column of the ANNOVAR file """
+    raw_genes = _raw_genes(files)
+    return (lambda: [deliverable7.get_gene_name(gene) for gene in raw_genes],
+            len(raw_genes), None)
+
+
+def bench_get_gene_names(files):
+    """ gene_names.get_gene_names (batch) on the RefSeq_Gene column """
+    raw_genes = _raw_genes(files)
+    return lambda: gene_names.get_gene_names(raw_genes), len(raw_genes), None
+
+
+def bench_get_gene_name_legacy(files):
+    """ The gene name filter before `gene_names` on the RefSeq_Gene column """
+    raw_genes = _raw_genes(files)
+    return (lambda: [_legacy_get_gene_name(gene) for gene in raw_genes],
+            len(raw_genes), None)
+
+
+def _sqlite_filler(files):
+    """ Returns an AnnovarDatabaseFiller with a new SQLite database next to the ANNOVAR file """
+    database = files['tabular'] + '.db'
+    for filename in (database, database + '-wal', database + '-shm'):
+        if os.path.exists(filename):
+            os.remove(filename)
+    return deliverable9.AnnovarDatabaseFiller(backend=deliverable9.SQLiteBackend(database))
+
+
+def bench_load_annovar_sqlite(files):
+    """ deliverable9 loading the ANNOVAR file in batches into a SQLite database """
+    filler = _sqlite_filler(files)
+    return (lambda: filler.parse_annovar(files['tabular']),
+            _count_lines(files['tabular']), files['tabular'])
+
+
+def bench_bulk_load_annovar_sqlite(files):
+    """ deliverable9.bulk_load of the ANNOVAR file into a SQLite database """
+    filler = _sqlite_filler(files)
+    return (lambda: filler.bulk_load(files['tabular']),
+            _count_lines(files['tabular']), files['tabular'])
+
+
+BENCHMARKS = {
+    'parse_bed_data': bench_parse_bed_data,
+    'parse_pileup_data': bench_parse_pileup_data,
+    'scan_pileup': bench_scan_pileup,
+    'calculate_mapping_coverage': bench_calculate_mapping_coverage,
+    'parse_vcf_data': bench_parse_vcf_data,
+    'parse_annovar': bench_parse_annovar,
+    'get_gene_name': bench_get_gene_name,
+    'get_gene_names': bench_get_gene_names,
+    'get_gene_name_legacy': bench_get_gene_name_legacy,
+    'load_annovar_sqlite': bench_load_annovar_sqlite,
+    'bulk_load_annovar_sqlite': bench_bulk_load_annovar_sqlite,
+}
+
+# Seconds between checks if a benchmark process is still running
+POLL_INTERVAL = 1.0
+
+
+def _count_lines(filename):
+    """ Counts the lines of a file """
+    with open(filename, 'rb') as data:
+        return sum(1 for _ in data)
+
+
+def _peak_rss_mb():
+    """ Returns the peak RSS of the current process in MB """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_benchmark(name, files, results):
+    """ Runs a single benchmark, this is done in a separate process """
+    with contextlib.redirect_stdout(io.StringIO()):
+        function, lines, input_file = BENCHMARKS[name](files)
+        setup_rss = _peak_rss_mb()
+
+        start_time = time.perf_counter()
+        function()
+        seconds = max(time.perf_counter() - start_time, 1e-9)
+
+    result = {'seconds': round(seconds, 4),
+              'lines': lines,
+              'lines_per_second': round(lines / seconds, 1),
+              'setup_rss_mb': round(setup_rss, 1),
+              'peak_rss_mb': round(_peak_rss_mb(), 1)}
+    if input_file is not None:
+        result['mb_per_second'] = round(os.path.getsize(input_file) / seconds / 1e6, 2)
+    results.put(result)
+
+
+def _wait_for_result(process, queue):
+    """
+    Waits for the result of a benchmark process, returns None if the
+    process ended (crashed or was killed) without a result
+    """
+    while True:
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            if not process.is_alive():
+                break
+    # The result may have arrived just before the process ended
+    try:
+        return queue.get(timeout=POLL_INTERVAL)
+    except Empty:
+        return None
+
+
+def run_benchmarks(names, files):
+    """
+    Runs the given benchmarks, each in a new process. A benchmark whose
+    process ends without a result gets an 'error' instead of measurements.
+
+    Args:
+        names (List): The names of the benchmarks (keys of BENCHMARKS)
+        files (Dictionary): The generated files, as returned by `generate_files`
+    Return:
+        results (Dictionary): The results of each benchmark
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target=_run_benchmark, args=(name, files, queue))
+        process.start()
+        result = _wait_for_result(process, queue)
+        process.join()
+        if result is None:
+            results[name] = {'error': 'process failed with exit code {}'.format(
+                process.exitcode)}
+            print('{:<28} FAILED: {}'.format(name, results[name]['error']))
+            continue
+        results[name] = result
+        print('{:<28} {:>10.3f} s {:>14.0f} lines/s {:>10.1f} MB peak RSS'.format(
+            name, results[name]['seconds'], results[name]['lines_per_second'],
+            results[name]['peak_rss_mb']))
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compares the results against a baseline
+
+    Args:
+        results (Dictionary): The results of `run_benchmarks`
+        baseline (Dictionary): Earlier results of `run_benchmarks`
+        tolerance (Float): The allowed relative change, e.g. 0.1 for 10%
+    Return:
+        regressions (List): A message for every regression found
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or 'error' in result or 'error' in baseline[name]:
+            continue
+        old = baseline[name]
+        if result['lines_per_second'] < old['lines_per_second'] * (1 - tolerance):
+            regressions.append('{}: throughput dropped from {:.0f} to {:.0f} lines/s'.format(
+                name, old['lines_per_second'], result['lines_per_second']))
+        if result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            regressions.append('{}: peak RSS grew from {:.1f} to {:.1f} MB'.format(
+                name, old['peak_rss_mb'], result['peak_rss_mb']))
+    return regressions
+
+
+# MAIN
+def main(args):
+    """ Main function """
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the parsing pipeline on generated data files')
+    parser.add_argument('benchmarks', nargs='*', default=[],
+                        help='benchmarks to run, by default all: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('-n', '--lines', type=int, default=100000,
+                        help='number of lines of the pileup, VCF and ANNOVAR files')
+    parser.add_argument('-d', '--data_dir', type=str, default='bench_data',
+                        help='directory for the generated data files')
+    parser.add_argument('-o', '--output', type=str, default='bench_results.json',
+                        help='name of the JSON output file')
+    parser.add_argument('-b', '--baseline', type=str,
+                        help='JSON output of an earlier run to compare against')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='allowed relative change against the baseline')
+    args = parser.parse_args(args[1:])
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: {}'.format(name))
+
+    files = generate_files(args.data_dir, args.lines)
+    results = run_benchmarks(args.benchmarks or list(BENCHMARKS), files)
+
+    with open(args.output, 'w') as output:
+        json.dump({'lines': args.lines, 'results': results}, output, indent=4)
+    print('Results written to', args.output)
+
+    failed = [name for name, result in results.items() if 'error' in result]
+    if failed:
+        print('FAILED', ', '.join(failed))
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_data:
+            baseline = json.load(baseline_data)
+        if baseline.get('lines') != args.lines:
+            print('Warning: the baseline was made with', baseline.get('lines'), 'lines')
+        regressions = compare_to_baseline(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            return 1
+        print('No regressions against', args.baseline)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""
+BFV2 Theme 05 - Genomics - Sequencing Project
+
+Transparent reading of plain, gzip and BGZF compressed input files.
+
+BGZF files (as written by bgzip) consist of independent gzip blocks of at
+most 64 KB. The blocks of a BGZF file are decompressed in parallel by a
+pool of threads (zlib releases the GIL while decompressing) and returned
+in their original order, so the parsers can read the data as if it was a
+plain file.
+
+    usage:
+        python3 compressed_input.py input_file
+"""
+
+# METADATA VARIABLES
+__author__ = "Micha Beens, Nadia Choudhury"
+__status__ = "Finished"
+__version__ = "2019.ci.v1"
+
+# IMPORT
+import sys
+import os
+import io
+import gzip
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Size of the fixed part of a BGZF block header
+BGZF_HEADER_SIZE = 12
+
+
+# FUNCTIONS
+def is_gzip(filename):
+    """
+    Checks if the given file is gzip compressed (this includes BGZF)
+
+    Args:
+        filename (String): The filename of the file
+    Return:
+        (Bool): The value that says if the file is gzip compressed
+    """
+    with open(filename, 'rb') as file_data:
+        return file_data.read(2) == GZIP_MAGIC
+
+
+def is_bgzf(filename):
+    """
+    Checks if the given file is BGZF compressed, by looking for the 'BC'
+    field in the extra header of the first block
+
+    Args:
+        filename (String): The filename of the file
+    Return:
+        (Bool): The value that says if the file is BGZF compressed
+    """
+    with open(filename, 'rb') as file_data:
+        header = file_data.read(BGZF_HEADER_SIZE)
+        if len(header) < BGZF_HEADER_SIZE or header[:2] != GZIP_MAGIC or \
+                not header[3] & 4:
+            return False
+        extra = file_data.read(struct.unpack('<H', header[10:12])[0])
+        return _bgzf_block_size(extra) is not None
+
+
+def _bgzf_block_size(extra):
+    """ Returns the BSIZE value of the 'BC' field in a gzip extra header, or None """
+    position = 0
+    while position + 4 <= len(extra):
+        field_id = extra[position:position + 2]
+        field_length = struct.unpack('<H', extra[position + 2:position + 4])[0]
+        if field_id == b'BC' and field_length == 2:
+            return struct.unpack('<H', extra[position + 4:position + 6])[0]
+        position += 4 + field_length
+    return None
+
+
+def bgzf_blocks(file_data):
+    """
+    Reads the compressed blocks of a BGZF file one at a time
+
+    Args:
+        file_data (File): The BGZF file, opened in binary mode
+    Return:
+        (Generator): A (deflate data, crc, uncompressed size) tuple per block
+    Raises:
+        ValueError: If a block is not a valid BGZF block
+    """
+    while True:
+        header = file_data.read(BGZF_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) < BGZF_HEADER_SIZE or header[:2] != GZIP_MAGIC:
+            raise ValueError('Invalid BGZF block header')
+
+        extra = file_data.read(struct.unpack('<H', header[10:12])[0])
+        block_size = _bgzf_block_size(extra)
+        if block_size is None:
+            raise ValueError('BGZF block without a block size')
+
+        # The rest of the block is the deflate data followed by CRC32 and ISIZE
+        rest = file_data.read(block_size + 1 - BGZF_HEADER_SIZE - len(extra))
+        crc, size = struct.unpack('<II', rest[-8:])
+        yield rest[:-8], crc, size
+
+
+def decompress_block(block):
+    """
+    Decompresses a single block as returned by `bgzf_blocks`
+
+    Args:
+        block (Tuple): The deflate data, crc and uncompressed size of the block
+    Return:
+        data (Bytes): The decompressed data
+    Raises:
+        ValueError: If the decompressed data does not match the crc or size
+    """
+    deflate_data, crc, size = block
+    data = zlib.decompress(deflate_data, -15)
+    if len(data) != size or zlib.crc32(data) != crc:
+        raise ValueError('Corrupt BGZF block')
+    return data
+
+
+def read_bgzf(filename, workers=None):
+    """
+    Decompresses a BGZF file with a pool of threads
+
+    Args:
+        filename (String): The filename of the BGZF file
+        workers (Int): The number of threads, by default the number of CPUs
+    Return:
+        (Generator): The decompressed data of each block, in file order
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with open(filename, 'rb') as file_data, ThreadPoolExecutor(workers) as pool:
+        # Keep a limited number of blocks in progress, so memory stays bounded
+        pending = deque()
+        for block in bgzf_blocks(file_data):
+            pending.append(pool.submit(decompress_block, block))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _ChunkReader(io.RawIOBase):
+    """
+    Raw binary stream reading from an iterator of byte chunks
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b''
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Get the next non-empty chunk once the current one is used up
+        while self.position >= len(self.chunk):
+            self.chunk = next(self.chunks, None)
+            self.position = 0
+            if self.chunk is None:
+                self.chunk = b''
+                return 0
+
+        size = min(len(buffer), len(self.chunk) - self.position)
+        buffer[:size] = self.chunk[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+        super().close()
+
+
+def open_input(filename, mode='r', workers=None):
+    """
+    Opens a plain, gzip or BGZF compressed file for reading
+
+    Args:
+        filename (String): The filename of the file
+        mode (String): 'r' for text or 'rb' for binary mode
+        workers (Int): The number of threads used to decompress a BGZF file
+    Return:
+        (File): The opened file, with the decompressed data
+    """
+    binary = 'b' in mode
+
+    if is_bgzf(filename):
+        data = io.BufferedReader(_ChunkReader(read_bgzf(filename, workers)),
+                                 buffer_size=1024 * 1024)
+        return data if binary else io.TextIOWrapper(data)
+    if is_gzip(filename):
+        return gzip.open(filename, 'rb' if binary else 'rt')
+    return open(filename, 'rb' if binary else 'r')
+
+
+def is_compressed(filename):
+    """
+    Checks if the given file is gzip or BGZF compressed, these files can
+    only be read from start to end
+
+    Args:
+        filename (String): The filename of the file
+    Return:
+        (Bool): The value that says if the file is compressed
+    """
+    return is_gzip(filename)
+
+
+def uncompressed_size(filename):
+    """
+    Returns the size of the file after decompression. The sizes of the
+    blocks of a BGZF file are added up, for other gzip files the size of
+    the last member is used, which is only an estimate for files larger
+    than 4 GB or with multiple members.
+
+    Args:
+        filename (String): The filename of the file
+    Return:
+        size (Int): The (estimated) uncompressed size in bytes
+    """
+    if is_bgzf(filename):
+        # Jump from block to block, only reading the headers and sizes
+        size = 0
+        with open(filename, 'rb') as file_data:
+            header = file_data.read(BGZF_HEADER_SIZE)
+            while len(header) == BGZF_HEADER_SIZE:
+                extra = file_data.read(struct.unpack('<H', header[10:12])[0])
+                block_end = file_data.tell() - BGZF_HEADER_SIZE - len(extra) + \
+                    _bgzf_block_size(extra) + 1
+                file_data.seek(block_end - 4)
+                size += struct.unpack('<I', file_data.read(4))[0]
+                header = file_data.read(BGZF_HEADER_SIZE)
+        return size
+    if is_gzip(filename):
+        with open(filename, 'rb') as file_data:
+            file_data.seek(-4, os.SEEK_END)
+            return struct.unpack('<I', file_data.read(4))[0]
+    return os.path.getsize(filename)
+
+
+# MAIN
+def main(args):
+    """ Main function that prints the type and uncompressed size of a file """
+    if len(args) < 2:
+        print(__doc__)
+        return 1
+
+    filename = args[1]
+    if is_bgzf(filename):
+        file_type = 'BGZF'
+    elif is_gzip(filename):
+        file_type = 'gzip'
+    else:
+        file_type = 'plain'
+    print(filename, 'is a', file_type, 'file of', uncompressed_size(filename),
+          'uncompressed bytes')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
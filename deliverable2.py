@@ -22,16 +22,63 @@ __version__ = "2018.d2.v1"
 
 # IMPORT
 import sys
+from bisect import bisect_left, bisect_right
 
 # FUNCTIONS
-def parse_pileup_data(pileup_data, bed_dict):
+def build_bed_index(bed_dict):
+    """ Function that builds a per-chromosome interval index from the parsed
+    BED data, used for fast lookups of the exons covering a position.
+
+    The exon coordinates of each chromosome are cut into non-overlapping
+    segments. For every chromosome the index holds the sorted segment
+    borders and, per segment, the numbers of all exons (their position in
+    `bed_dict[chromosome]`) covering that segment. Overlapping exons are
+    all kept, in the order of the BED data.
+    """
+    # Create empty dictionary to hold the index
+    bed_index = {}
+
+    for chrome, exons in bed_dict.items():
+        # Every start and stop coordinate begins a new segment
+        borders = sorted({coord for exon in exons for coord in exon[:2]})
+        segments = [[] for _ in borders]
+
+        # Add the exon number to every segment the exon covers
+        for exon_nr, exon in enumerate(exons):
+            first = bisect_left(borders, exon[0])
+            last = bisect_left(borders, exon[1])
+            for segment in range(first, last):
+                segments[segment].append(exon_nr)
+
+        bed_index[chrome] = (borders, [tuple(segment) for segment in segments])
+
+    return bed_index
+
+
+def find_exons(bed_index, chrome, pos):
+    """ Function that returns the numbers of all exons of `chrome` that
+    contain position `pos`, using the index made by `build_bed_index`.
+    """
+    borders, segments = bed_index[chrome]
+    segment = bisect_right(borders, pos) - 1
+    if segment < 0:
+        return ()
+    return segments[segment]
+
+
+def parse_pileup_data(pileup_data, bed_dict, bed_index=None):
     """ Function that parses pileup data and collects the per-base coverage
     of all exons contained in the BED data.
 
     Iterate over all pileup lines and for each line:
         - check if the position falls within an exon (from `bed_dict`)
             - if so; add the coverage to the `coverage_dict` for the correct gene
+
+    The exons are looked up with an interval index (see `build_bed_index`),
+    which is built from `bed_dict` unless a prebuilt `bed_index` is given.
     """
+    if bed_index is None:
+        bed_index = build_bed_index(bed_dict)
 
     ## Remove thse print statements after the first time executing this program
     #print('Input pilup data: ', pileup_data)
@@ -48,20 +95,17 @@ def parse_pileup_data(pileup_data, bed_dict):
         pos = line[1]
         cov = line[3]
         # Check if the chromosome is contained in the bed_dict
-        if chrom in bed_dict:
-            # If yes; extract the coordinate from the pileup and compare to all
-            #         exons for that chromosome in the `bed_dict`
-            #         If the position falls within an exon, add the coverage
-            #         value to the list for the gene in the `coverage_dict`
-            for tup in bed_dict[chrom]:
-                gen = tup[2]
-                start = tup[0]
-                end = tup[1]
-                if int(pos) in range(start, end):
-                    if gen in coverage_dict.keys():
-                        coverage_dict[gen].append(int(cov))
-                    else:
-                        coverage_dict[gen] = [int(cov)]
+        if chrom in bed_index:
+            # If yes; look up all exons for that chromosome in the `bed_dict`
+            #         that contain the coordinate from the pileup and add the
+            #         coverage value to the list for the gene in the `coverage_dict`
+            exons = bed_dict[chrom]
+            for exon_nr in find_exons(bed_index, chrom, int(pos)):
+                gen = exons[exon_nr][2]
+                if gen in coverage_dict:
+                    coverage_dict[gen].append(int(cov))
+                else:
+                    coverage_dict[gen] = [int(cov)]
 
     # Return coverage dictionary
     return coverage_dict
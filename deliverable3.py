@@ -27,6 +27,7 @@ __version__ = "2018.d3.1"
 # IMPORT
 import sys
 import csv
+import compressed_input
 
 
 # FUNCTIONS
@@ -42,10 +43,10 @@ def mean(values):
 
 def read_data(filename):
     """ This function reads in data and returns a list containing one
-        line per element. """
+        line per element. The file may be gzip or BGZF compressed. """
 
     # Open the file given the filename stored in 'filename'
-    with open(filename) as file_data:
+    with compressed_input.open_input(filename) as file_data:
         data = [line.strip() for line in file_data]
     # Return a list where each line is a list element
     return data
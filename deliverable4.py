@@ -22,7 +22,8 @@ Script for a program performing the following steps:
 Deliverable 4
 -------------
     usage:
-        python3 deliverable4.py [bed-file.bed] [pileup-file.pileup]
+        python3 deliverable4.py [-w workers] [-r {stream,mmap,index}] [--histogram]
+                                [-p seconds] [-m metrics.json] [bed-file.bed] [pileup-file.pileup] [output.csv]
 """
 
 # METADATA VARIABLES
@@ -32,21 +33,167 @@ __version__ = "2019.d4.v1"
 
 # IMPORT
 import sys
+import os
 import csv
+import argparse
+import mmap
+import time
+import json
+from multiprocessing import Pool
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import compress
+from math import floor
+import position_index
+import compressed_input
+
+# Number of lines between two progress checks while parsing pileup data
+PROGRESS_LINES = 65536
+# Coverage values of this value or higher are counted together in a histogram
+MAX_DEPTH = 1000
+# Percentiles and breadth thresholds reported by `calculate_coverage_distribution`
+PERCENTILES = (10, 25, 75, 90)
+THRESHOLDS = (10, 20, 30, 50, 100)
 
 
 # FUNCTIONS
 def read_data(filename):
     """ This function reads in data and returns a list containing one
-        line per element. """
+        line per element. The file may be gzip or BGZF compressed. """
 
     # Open the file given the filename stored in 'filename'
-    with open(filename) as file_data:
+    with compressed_input.open_input(filename) as file_data:
         data = [line.strip() for line in file_data]
     # Return a list where each line is a list element
     return data
 
 
+def stream_data(filename, stats=None):
+    """ This function reads in data one line at a time and yields each
+        stripped line, so the file is never held in memory as a whole.
+
+        If a `stats` dictionary is given, the number of 'lines' and 'bytes'
+        read so far are kept up to date in it, a `ProgressReporter` can use
+        these to report the progress. The file may be gzip or BGZF
+        compressed, then the bytes are counted after decompression.
+    """
+    if stats is None:
+        stats = {}
+    stats['lines'] = 0
+    stats['bytes'] = 0
+
+    # Open the file in binary mode so the bytes read can be counted
+    with compressed_input.open_input(filename, 'rb') as file_data:
+        for line in file_data:
+            stats['lines'] += 1
+            stats['bytes'] += len(line)
+
+            yield line.decode().strip()
+
+
+class ProgressReporter:
+    """
+    Reports the progress of parsing pileup data at intervals.
+
+    The parse functions call `update` once every PROGRESS_LINES lines, a
+    report (lines/s, bytes/s, matched and skipped lines and the ETA) is only
+    written when at least `interval` seconds have passed since the last one.
+    Reports are written to `output` (standard error by default) and/or
+    appended as JSON lines to `metrics_file`.
+    """
+
+    def __init__(self, total_lines=None, total_bytes=None, stats=None, interval=2.0,
+                 output=sys.stderr, metrics_file=None):
+        self.total_lines = total_lines
+        self.total_bytes = total_bytes
+        self.stats = stats
+        self.interval = interval
+        self.output = output
+        self.metrics_file = metrics_file
+        self.start_time = time.perf_counter()
+        self.last_report = self.start_time
+
+        # Start a new metrics file
+        if metrics_file is not None:
+            open(metrics_file, 'w').close()
+
+    def update(self, lines, matched, bytes_read=None):
+        """
+        Writes a report if the interval has passed
+
+        Args:
+            lines (Int): The number of lines read so far
+            matched (Int): The number of lines within an exon so far
+            bytes_read (Int): The number of bytes read so far, by default
+                              taken from the `stats` dictionary
+        """
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(self.metrics(lines, matched, bytes_read, now))
+
+    def finish(self, lines, matched, bytes_read=None):
+        """
+        Writes the final report
+        """
+        metrics = self.metrics(lines, matched, bytes_read, time.perf_counter())
+        metrics['finished'] = True
+        self.report(metrics)
+
+    def metrics(self, lines, matched, bytes_read, now):
+        """
+        Calculates the progress metrics
+
+        Return:
+            metrics (Dictionary): The progress metrics
+        """
+        if bytes_read is None and self.stats is not None:
+            bytes_read = self.stats.get('bytes')
+        seconds = max(now - self.start_time, 1e-9)
+
+        metrics = {'seconds': round(seconds, 2),
+                   'lines': lines,
+                   'matched_lines': matched,
+                   'skipped_lines': lines - matched,
+                   'lines_per_second': round(lines / seconds)}
+        if bytes_read is not None:
+            metrics['bytes'] = bytes_read
+            metrics['bytes_per_second'] = round(bytes_read / seconds)
+
+        # The fraction done, preferably based on the bytes read
+        fraction = None
+        if bytes_read is not None and self.total_bytes:
+            fraction = bytes_read / self.total_bytes
+        elif self.total_lines:
+            fraction = lines / self.total_lines
+        if fraction:
+            metrics['percent_done'] = round(100 * min(fraction, 1), 1)
+            metrics['eta_seconds'] = round(max(seconds / fraction - seconds, 0))
+
+        return metrics
+
+    def report(self, metrics):
+        """
+        Writes the metrics to the output and/or metrics file
+        """
+        if self.output is not None:
+            message = 'Progress: {} lines, {} lines/s'.format(metrics['lines'],
+                                                            metrics['lines_per_second'])
+            if 'bytes_per_second' in metrics:
+                message += ', {:.1f} MB/s'.format(metrics['bytes_per_second'] / 1e6)
+            message += ', {} matched / {} skipped'.format(metrics['matched_lines'],
+                                                          metrics['skipped_lines'])
+            if 'percent_done' in metrics:
+                message += ', {}% done, ETA {}s'.format(metrics['percent_done'],
+                                                       metrics['eta_seconds'])
+            print(message, file=self.output, flush=True)
+
+        if self.metrics_file is not None:
+            with open(self.metrics_file, 'a') as output:
+                output.write(json.dumps(metrics) + '\n')
+
+
 def parse_bed_data(bed_data):
     """ Function that parses BED data and stores its contents
     in a dictionary
@@ -74,52 +221,620 @@ def parse_bed_data(bed_data):
     return bed_dict
 
 
-def parse_pileup_data(pileup_data, bed_dict):
+def build_bed_index(bed_dict):
+    """ Function that builds a per-chromosome interval index from the parsed
+    BED data, used for fast lookups of the exons covering a position.
+
+    The exon coordinates of each chromosome are cut into non-overlapping
+    segments. For every chromosome the index holds the sorted segment
+    borders and, per segment, the numbers of all exons (their position in
+    `bed_dict[chromosome]`) covering that segment. Overlapping exons are
+    all kept, in the order of the BED data.
+    """
+    # Create empty dictionary to hold the index
+    bed_index = {}
+
+    for chrome, exons in bed_dict.items():
+        # Every start and stop coordinate begins a new segment
+        borders = sorted({coord for exon in exons for coord in exon[:2]})
+        segments = [[] for _ in borders]
+
+        # Add the exon number to every segment the exon covers
+        for exon_nr, exon in enumerate(exons):
+            first = bisect_left(borders, exon[0])
+            last = bisect_left(borders, exon[1])
+            for segment in range(first, last):
+                segments[segment].append(exon_nr)
+
+        bed_index[chrome] = (borders, [tuple(segment) for segment in segments])
+
+    return bed_index
+
+
+def find_exons(bed_index, chrome, pos):
+    """ Function that returns the numbers of all exons of `chrome` that
+    contain position `pos`, using the index made by `build_bed_index`.
+    """
+    borders, segments = bed_index[chrome]
+    segment = bisect_right(borders, pos) - 1
+    if segment < 0:
+        return ()
+    return segments[segment]
+
+
+class GeneCoverage:
+    """
+    Compact storage of the per-base coverage of a single gene.
+
+    A slot is reserved for every base of every exon of the gene. The
+    coverage values are kept in an unsigned int array, a byte array marks
+    which slots have been filled by the pileup data. A slot keeps the first
+    coverage value it gets, just like a `CoverageHistogram`. Slots that are
+    not filled keep the value 0, so the statistics work on the whole array.
+    """
+
+    def __init__(self, size):
+        self.values = array('I', [0]) * size
+        self.filled = bytearray(size)
+        self.count = 0
+
+    def add(self, slot, coverage):
+        """
+        Stores the coverage of the base belonging to the given slot, if the
+        slot is not filled yet
+
+        Args:
+            slot (Int): The slot of the base
+            coverage (Int): The coverage of the base
+        """
+        if not self.filled[slot]:
+            self.values[slot] = coverage
+            self.filled[slot] = 1
+            self.count += 1
+
+    def merge(self, other):
+        """
+        Copies the filled slots of another `GeneCoverage` of the same gene
+        that are not filled in this one. Each run of consecutive new slots
+        is copied as a single slice.
+
+        Args:
+            other (GeneCoverage): The coverage to copy the filled slots from
+        """
+        size = len(self.filled)
+        # The slots filled in `other` only, as a byte (0 or 1) per slot
+        new = (int.from_bytes(other.filled, 'little') &
+               ~int.from_bytes(self.filled, 'little')).to_bytes(size, 'little')
+        start = new.find(1)
+        while start >= 0:
+            stop = new.find(0, start)
+            if stop < 0:
+                stop = size
+            self.values[start:stop] = other.values[start:stop]
+            self.filled[start:stop] = new[start:stop]
+            start = new.find(1, stop)
+        self.count += new.count(1)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return compress(self.values, self.filled)
+
+    def mean(self):
+        """
+        Calculates the mean coverage of all filled slots
+        """
+        return sum(self.values) / self.count
+
+    def count_below(self, threshold):
+        """
+        Counts the filled slots with a coverage below the given threshold
+        """
+        return sum(map(threshold.__gt__, compress(self.values, self.filled)))
+
+    def tolist(self):
+        """
+        Returns the coverage of all filled slots as a list
+        """
+        return list(self)
+
+
+class CoverageHistogram:
+    """
+    Constant-memory coverage statistics of a single gene.
+
+    Only the number of positions, the sum of their coverage and a histogram
+    with the number of positions per coverage value are kept. Coverage
+    values of `max_depth` or more share the last bin of the histogram.
+    With a `size`, a bit per slot marks the counted slots, so a position
+    that occurs more than once is only counted with its first coverage
+    value, just like a `GeneCoverage`.
+    """
+
+    def __init__(self, max_depth=MAX_DEPTH, size=0):
+        self.max_depth = max_depth
+        self.counts = array('I', [0]) * (max_depth + 1)
+        self.count = 0
+        self.total = 0
+        self.filled = bytearray((size + 7) // 8)
+
+    def add(self, slot, coverage):
+        """
+        Adds the coverage of a base to the statistics
+
+        Args:
+            slot (Int): The slot of the base, a slot that is already counted
+                        is skipped. With None the coverage is always counted.
+            coverage (Int): The coverage of the base
+        """
+        if slot is not None:
+            bit = 1 << (slot & 7)
+            if self.filled[slot >> 3] & bit:
+                return
+            self.filled[slot >> 3] |= bit
+        self.counts[min(coverage, self.max_depth)] += 1
+        self.count += 1
+        self.total += coverage
+
+    @classmethod
+    def from_values(cls, values, max_depth=MAX_DEPTH):
+        """
+        Creates a histogram from a list (or `GeneCoverage`) of coverage values
+        """
+        histogram = cls(max_depth=max_depth)
+        for coverage in values:
+            histogram.add(None, coverage)
+        return histogram
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        """
+        Calculates the mean coverage of all positions
+        """
+        return self.total / self.count
+
+    def count_below(self, threshold):
+        """
+        Counts the positions with a coverage below the given threshold, the
+        threshold should not be above `max_depth`
+        """
+        return sum(self.counts[:threshold])
+
+    def breadth(self, threshold):
+        """
+        Calculates the percentage of positions with a coverage of at least
+        the given threshold
+        """
+        return 100 * (self.count - self.count_below(threshold)) / self.count
+
+    def value_at(self, rank):
+        """
+        Returns the coverage at the given rank (starting at 0) when all
+        coverage values would be sorted
+        """
+        seen = 0
+        for depth, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                return depth
+        return self.max_depth
+
+    def percentile(self, percent):
+        """
+        Calculates a percentile of the coverage, interpolating between the
+        two closest ranks. Percentile 50 gives the median.
+        """
+        rank = (self.count - 1) * percent / 100
+        lower = self.value_at(floor(rank))
+        upper = self.value_at(min(floor(rank) + 1, self.count - 1))
+        return lower + (upper - lower) * (rank - floor(rank))
+
+
+def allocate_coverage(bed_dict, histograms=False):
+    """ Function that reserves a slot for every exon base of every gene in
+    the BED data. The coverage of a gene is only created when it is first
+    covered, by calling the `create` function of one of its exons, which
+    returns a `GeneCoverage` with one slot per exon base, or a
+    `CoverageHistogram` if `histograms` is True.
+
+    Returns a dictionary with for every chromosome a list that matches
+    `bed_dict[chromosome]`, holding a (gene, create, base) tuple per exon.
+    The slot of a position in an exon is `base + position`.
+    """
+    # Count the number of bases of all exons of each gene
+    gene_sizes = {}
+    for exons in bed_dict.values():
+        for start, stop, gene in exons:
+            gene_sizes[gene] = gene_sizes.get(gene, 0) + max(stop - start, 0)
+
+    if histograms:
+        creates = {gene: partial(CoverageHistogram, size=size) for gene, size in gene_sizes.items()}
+    else:
+        creates = {gene: partial(GeneCoverage, size) for gene, size in gene_sizes.items()}
+
+    # Give each exon its own range of slots within the gene
+    exon_slots = {}
+    offsets = {gene: 0 for gene in gene_sizes}
+    for chrom, exons in bed_dict.items():
+        exon_slots[chrom] = []
+        for start, stop, gene in exons:
+            exon_slots[chrom].append((gene, creates[gene], offsets[gene] - start))
+            offsets[gene] += max(stop - start, 0)
+
+    return exon_slots
+
+
+def coverage_to_lists(coverage_dict):
+    """ Function that converts a coverage dictionary holding `GeneCoverage`
+    objects to a dictionary with a list of coverage values per gene.
+
+    The values of each gene are ordered by exon (in BED order) and position.
+    """
+    return {gene: coverage.tolist() for gene, coverage in coverage_dict.items()}
+
+
+def parse_pileup_data(pileup_data, bed_dict, bed_index=None, progress=True,
+                      histograms=False):
     """ Function that parses pileup data and collects the per-base coverage
     of all exons contained in the BED data.
 
     Iterate over all pileup lines and for each line:
         - check if the position falls within an exon (from `bed_dict`)
             - if so; add the coverage to the `coverage_dict` for the correct gene
+
+    The exons are looked up with an interval index (see `build_bed_index`),
+    which is built from `bed_dict` unless a prebuilt `bed_index` is given.
+
+    `pileup_data` can be a list or any iterable of lines, such as the
+    generator returned by `stream_data`. The progress is reported by
+    `progress`, a `ProgressReporter` (or an object with the same `update`
+    and `finish` methods). With True a `ProgressReporter` writing to
+    standard error is used, with False or None nothing is reported.
+
+    The coverage of each gene is stored in a `GeneCoverage` object, where
+    every exon position has its own slot. A position that occurs more than
+    once in the pileup data keeps the first coverage value. Use
+    `coverage_to_lists` to get a dictionary with lists of values. With
+    `histograms` the coverage is only counted in a `CoverageHistogram`.
     """
+    if bed_index is None:
+        bed_index = build_bed_index(bed_dict)
 
-    # Create empty dictionary to hold the data
+    # Create empty dictionary to hold the data, genes are added once covered
     coverage_dict = {}
+    exon_slots = allocate_coverage(bed_dict, histograms)
 
+    if progress is True:
+        progress = ProgressReporter(total_lines=len(pileup_data)
+                                    if hasattr(pileup_data, '__len__') else None)
+
+    # Only check the progress once every PROGRESS_LINES lines
     counter = 0
-    comp_list = [int(len(pileup_data)/50*i) for i in range(50)]
-    print("Progress")
+    matched = 0
+    next_check = PROGRESS_LINES if progress else 0
 
     # Iterate over all the lines contained in the pileup_data
     for line in pileup_data:
-        if counter in comp_list:
-            print("-", end="")
-
         counter += 1
+        if counter == next_check:
+            progress.update(counter, matched)
+            next_check += PROGRESS_LINES
 
         line = line.split('\t')
         # Extract the 'chromosome' field and remove the 'chr' text
         chrom = line[0].replace('chr', '')
-        pos = line[1]
-        cov = line[3]
+        pos = int(line[1])
+        cov = int(line[3])
         # Check if the chromosome is contained in the bed_dict
-        if chrom in bed_dict:
-            # If yes; extract the coordinate from the pileup and compare to all
-            #         exons for that chromosome in the `bed_dict`
-            #         If the position falls within an exon, add the coverage
-            #         value to the list for the gene in the `coverage_dict`
-            for tup in bed_dict[chrom]:
-                gen = tup[2]
-                start = tup[0]
-                end = tup[1]
-                if start <= int(pos) < end:
-                    if gen in coverage_dict.keys():
-                        coverage_dict[gen].append(int(cov))
-                    else:
-                        coverage_dict[gen] = [int(cov)]
+        if chrom in bed_index:
+            # If yes; look up all exons for that chromosome in the `bed_dict`
+            #         that contain the coordinate from the pileup and store the
+            #         coverage value in the slot of the position for the gene
+            slots = exon_slots[chrom]
+            exon_nrs = find_exons(bed_index, chrom, pos)
+            if exon_nrs:
+                matched += 1
+            for exon_nr in exon_nrs:
+                gen, create, base = slots[exon_nr]
+                gene_coverage = coverage_dict.get(gen)
+                if gene_coverage is None:
+                    gene_coverage = coverage_dict[gen] = create()
+                gene_coverage.add(base + pos, cov)
 
     # Return coverage dictionary
-    print()
+    if progress:
+        progress.finish(counter, matched)
+    return coverage_dict
+
+
+def scan_pileup(pileup_file, bed_dict, bed_index=None, start=0, stop=None, stats=None,
+                histograms=False, progress=None):
+    """ Function that reads a pileup file and collects the per-base coverage
+    of all exons contained in the BED data, giving the same result as
+    `parse_pileup_data(read_data(pileup_file), bed_dict)`.
+
+    The file is memory-mapped and only the chromosome, position and
+    coverage columns are parsed, directly from the bytes of each line.
+    Lines on a chromosome without exons are skipped after reading the
+    chromosome. Only the byte range `start` to `stop` is read, by default
+    the whole file. If a `stats` dictionary is given, the number of 'lines'
+    and 'bytes' read are stored in it. See `parse_pileup_data` for
+    `histograms` and `progress`.
+    """
+    if bed_index is None:
+        bed_index = build_bed_index(bed_dict)
+    if stats is None:
+        stats = {}
+    stats['lines'] = 0
+    stats['bytes'] = 0
+
+    coverage_dict = {}
+    exon_slots = allocate_coverage(bed_dict, histograms)
+
+    # The exon slots and index of each raw chromosome field, None if not in the BED data
+    chrom_exons = {}
+
+    if os.path.getsize(pileup_file) == 0:
+        return coverage_dict
+
+    with open(pileup_file, 'rb') as file_data, \
+            mmap.mmap(file_data.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if stop is None:
+            stop = len(data)
+        data.seek(start)
+        offset = start
+        if progress is True:
+            progress = ProgressReporter(total_bytes=stop - start)
+        lines = 0
+        matched = 0
+        next_check = PROGRESS_LINES if progress else 0
+
+        while offset < stop:
+            line = data.readline()
+            offset += len(line)
+            lines += 1
+            if lines == next_check:
+                progress.update(lines, matched, offset - start)
+                next_check += PROGRESS_LINES
+
+            # Extract the 'chromosome' field and skip the line if it has no exons
+            raw_chrom = line[:line.find(b'\t')]
+            if raw_chrom not in chrom_exons:
+                chrom = raw_chrom.decode().replace('chr', '')
+                if chrom in bed_index:
+                    chrom_exons[raw_chrom] = (exon_slots[chrom],) + bed_index[chrom]
+                else:
+                    chrom_exons[raw_chrom] = None
+            exons = chrom_exons[raw_chrom]
+            if exons is None:
+                continue
+
+            # Only split off the position (2nd) and coverage (4th) fields
+            fields = line.split(b'\t', 4)
+            pos = int(fields[1])
+            cov = int(fields[3])
+
+            # Look up the exons containing the position (see `find_exons`)
+            slots, borders, segments = exons
+            segment = bisect_right(borders, pos) - 1
+            if segment < 0 or not segments[segment]:
+                continue
+            matched += 1
+            for exon_nr in segments[segment]:
+                gen, create, base = slots[exon_nr]
+                gene_coverage = coverage_dict.get(gen)
+                if gene_coverage is None:
+                    gene_coverage = coverage_dict[gen] = create()
+                gene_coverage.add(base + pos, cov)
+
+        stats['lines'] = lines
+        stats['bytes'] = offset - start
+        if progress:
+            progress.finish(lines, matched, offset - start)
+
+    return coverage_dict
+
+
+def merge_exons(exons):
+    """ Function that merges the (start, stop, gene) exon tuples of a single
+    chromosome into a sorted list of non-overlapping (start, stop) regions.
+    """
+    regions = []
+    for start, stop, _ in sorted(exons):
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], stop)
+        else:
+            regions.append([start, stop])
+    return [tuple(region) for region in regions]
+
+
+def fetch_pileup(pileup_file, bed_dict, bed_index=None, stats=None, histograms=False):
+    """ Function that collects the per-base coverage of all exons contained
+    in the BED data, giving the same result as `scan_pileup`.
+
+    For each exon the start- and end-coordinate are looked up in the
+    positional index of the (coordinate-sorted) pileup file, see
+    `position_index`, and only the lines within the exon are read. The
+    index is built first if it does not exist yet. If a `stats` dictionary
+    is given, the number of 'lines' and 'bytes' read are stored in it. See
+    `parse_pileup_data` for `histograms`.
+    """
+    if bed_index is None:
+        bed_index = build_bed_index(bed_dict)
+    if stats is None:
+        stats = {}
+    stats['lines'] = 0
+    stats['bytes'] = 0
+
+    coverage_dict = {}
+    exon_slots = allocate_coverage(bed_dict, histograms)
+    index = position_index.get_index(pileup_file)
+
+    with open(pileup_file, 'rb') as file_data:
+        # Go over the chromosomes in file order, so genes are added in the
+        # order they are first covered
+        for raw_chrom in index['chromosomes']:
+            chrom = raw_chrom.replace('chr', '')
+            if chrom not in bed_index:
+                continue
+
+            slots = exon_slots[chrom]
+            for start, stop in merge_exons(bed_dict[chrom]):
+                for line in position_index.fetch_lines(file_data, index, raw_chrom,
+                                                       start, stop, stats):
+                    fields = line.split(b'\t', 4)
+                    pos = int(fields[1])
+                    cov = int(fields[3])
+
+                    for exon_nr in find_exons(bed_index, chrom, pos):
+                        gen, create, base = slots[exon_nr]
+                        gene_coverage = coverage_dict.get(gen)
+                        if gene_coverage is None:
+                            gene_coverage = coverage_dict[gen] = create()
+                        gene_coverage.add(base + pos, cov)
+
+    return coverage_dict
+
+
+def split_file(filename, number):
+    """ Function that splits a file in (at most) `number` byte ranges of about
+    equal size. Every range starts at the beginning of a line.
+
+    Returns a list of (start, stop) byte offsets.
+    """
+    size = os.path.getsize(filename)
+    borders = [0]
+
+    with open(filename, 'rb') as file_data:
+        for i in range(1, number):
+            # Move to the first line starting at or after the split point
+            file_data.seek(max(size * i // number - 1, 0))
+            file_data.readline()
+            borders.append(max(file_data.tell(), borders[-1]))
+    borders.append(size)
+
+    return [(start, stop) for start, stop in zip(borders, borders[1:]) if start < stop]
+
+
+def read_chunk(filename, start, stop, stats=None):
+    """ This function yields the stripped lines of the byte range `start` to
+    `stop` of a file, as made by `split_file`.
+
+    If a `stats` dictionary is given, the number of 'lines' and 'bytes'
+    read are kept up to date in it.
+    """
+    if stats is None:
+        stats = {}
+    stats['lines'] = 0
+    stats['bytes'] = 0
+
+    with open(filename, 'rb') as file_data:
+        file_data.seek(start)
+        for line in file_data:
+            if stats['bytes'] >= stop - start:
+                break
+            stats['lines'] += 1
+            stats['bytes'] += len(line)
+
+            yield line.decode().strip()
+
+
+# BED data and index shared by all worker processes of `parse_pileup_parallel`
+_WORKER_BED = {}
+
+
+def _init_worker(bed_dict):
+    """ Stores the BED data and its index once in each worker process """
+    _WORKER_BED['bed_dict'] = bed_dict
+    _WORKER_BED['bed_index'] = build_bed_index(bed_dict)
+
+
+class _MatchedCounter:
+    """ Stores the number of 'matched' lines of a chunk in its stats dictionary,
+    used as the `progress` of the parse functions in a worker process """
+
+    def __init__(self, stats):
+        self.stats = stats
+        stats['matched'] = 0
+
+    def update(self, lines, matched, bytes_read=None):
+        pass
+
+    def finish(self, lines, matched, bytes_read=None):
+        self.stats['matched'] = matched
+
+
+def _parse_chunk(chunk):
+    """ Parses a single (filename, start, stop, reader) chunk in a worker
+    process, the coverage is kept per position (in `GeneCoverage` objects) """
+    filename, start, stop, reader = chunk
+    stats = {}
+    matched = _MatchedCounter(stats)
+    if reader == 'mmap':
+        coverage_dict = scan_pileup(filename, _WORKER_BED['bed_dict'],
+                                    bed_index=_WORKER_BED['bed_index'],
+                                    start=start, stop=stop, stats=stats, progress=matched)
+        return coverage_dict, stats
+
+    coverage_dict = parse_pileup_data(read_chunk(filename, start, stop, stats),
+                                      _WORKER_BED['bed_dict'],
+                                      bed_index=_WORKER_BED['bed_index'],
+                                      progress=matched)
+    return coverage_dict, stats
+
+
+def parse_pileup_parallel(pileup_file, bed_dict, workers, stats=None, reader='stream',
+                          histograms=False, progress=None):
+    """ Function that parses a pileup file with a pool of `workers` processes.
+
+    The file is split in line-aligned byte ranges (several per worker)
+    which are parsed independently by `parse_pileup_data`. The results are
+    merged in file order, so the returned coverage dictionary is identical
+    to parsing the whole file at once. If a `stats` dictionary is given,
+    the total number of 'lines' and 'bytes' read are stored in it. With
+    `reader` 'mmap' the chunks are parsed by `scan_pileup`. See
+    `parse_pileup_data` for `histograms`: the chunks keep the coverage per
+    position, so a position in more than one chunk is counted once, and
+    the merged coverage of each gene is converted to a `CoverageHistogram`
+    at the end. The `progress` (see `parse_pileup_data`) is updated with
+    the lines and bytes of every finished chunk.
+    """
+    if stats is None:
+        stats = {}
+    stats['lines'] = 0
+    stats['bytes'] = 0
+    matched = 0
+    if progress is True:
+        progress = ProgressReporter(total_bytes=os.path.getsize(pileup_file))
+
+    chunks = [(pileup_file, start, stop, reader)
+              for start, stop in split_file(pileup_file, workers * 4)]
+    coverage_dict = {}
+
+    with Pool(workers, initializer=_init_worker, initargs=(bed_dict,)) as pool:
+        for chunk_coverage, chunk_stats in pool.imap(_parse_chunk, chunks):
+            stats['lines'] += chunk_stats['lines']
+            stats['bytes'] += chunk_stats['bytes']
+            matched += chunk_stats['matched']
+            if progress:
+                progress.update(stats['lines'], matched, stats['bytes'])
+
+            # Merge in file order, genes are added in the order they are first covered
+            for gene, gene_coverage in chunk_coverage.items():
+                if gene in coverage_dict:
+                    coverage_dict[gene].merge(gene_coverage)
+                else:
+                    coverage_dict[gene] = gene_coverage
+
+    if progress:
+        progress.finish(stats['lines'], matched, stats['bytes'])
+    if histograms:
+        return {gene: CoverageHistogram.from_values(coverage)
+                for gene, coverage in coverage_dict.items()}
+
     return coverage_dict
 
 
@@ -164,16 +879,48 @@ def calculate_mapping_coverage(coverage_dict):
         #      * Total positions (gene length covered)
         #      * Average Coverage (use round with one position)
         #      * Number of low-coverage positions (coverage value < 30)
+        #      The coverage is a `GeneCoverage`, a `CoverageHistogram` or a list
         name = gene
         total_pos = len(coverage_dict[gene])
-        avg_cov = round(mean(coverage_dict[gene]), 1)
-        num_of_low_cov = sum([coverage < 30 for coverage in coverage_dict[gene]])
+        if isinstance(coverage_dict[gene], (GeneCoverage, CoverageHistogram)):
+            avg_cov = round(coverage_dict[gene].mean(), 1)
+            num_of_low_cov = coverage_dict[gene].count_below(30)
+        else:
+            avg_cov = round(mean(coverage_dict[gene]), 1)
+            num_of_low_cov = sum([coverage < 30 for coverage in coverage_dict[gene]])
         statistics.append((name, total_pos, avg_cov, num_of_low_cov))
 
     # Return the list of tuples holding the data
     return statistics
 
 
+def calculate_coverage_distribution(coverage_dict):
+    """ Function to calculate the coverage statistics of
+        `calculate_mapping_coverage` extended with the median, percentiles
+        (see PERCENTILES) and breadth of coverage (percentage of positions
+        with at least the coverage in THRESHOLDS) on a per-gene basis.
+
+        All statistics come from a single `CoverageHistogram` per gene. The
+        first element of the returned list is a header.
+    """
+    statistics = [('gene', 'positions', 'mean', 'below_30x', 'median',
+                   *['p{}'.format(percent) for percent in PERCENTILES],
+                   *['breadth_{}x'.format(threshold) for threshold in THRESHOLDS])]
+
+    for gene, coverage in coverage_dict.items():
+        if not isinstance(coverage, CoverageHistogram):
+            coverage = CoverageHistogram.from_values(coverage)
+
+        statistics.append((gene, len(coverage), round(coverage.mean(), 1),
+                           coverage.count_below(30), round(coverage.percentile(50), 1),
+                           *[round(coverage.percentile(percent), 1)
+                             for percent in PERCENTILES],
+                           *[round(coverage.breadth(threshold), 1)
+                             for threshold in THRESHOLDS]))
+
+    return statistics
+
+
 # MAIN
 def main(args):
     """ Main function connecting all functions
@@ -185,18 +932,45 @@ def main(args):
     ### INPUT ###
     # Try to read input en output filenames from the commandline. Use defaults if
     # they are missing and warn if the extensions are 'wrong'.
-    if len(args) > 1:
-        bed_file = args[1]
-        if not bed_file.lower().endswith('.bed'):
-            print('Warning: given BED file does not have a ".bed" extension.')
-        pileup_file = args[2]
-        if not pileup_file.lower().endswith('.pileup'):
-            print('Warning: given pileup file does not have a ".pileup" extension.')
-        output_file = args[3]
-    else:
-        bed_file = 'data/example.bed'
-        pileup_file = 'data/example.pileup'
-        output_file = 'data/d4_output.csv'
+    parser = argparse.ArgumentParser(
+        description='Calculates the per-gene coverage of the exons in a BED file '
+                    'from a pileup file and writes the statistics to a CSV file')
+    parser.add_argument('bed_file', nargs='?', default='data/example.bed',
+                        type=str, help='name of the BED input file')
+    parser.add_argument('pileup_file', nargs='?', default='data/example.pileup',
+                        type=str, help='name of the pileup input file')
+    parser.add_argument('output_file', nargs='?', default='data/d4_output.csv',
+                        type=str, help='name of the CSV output file')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes used to parse the pileup file')
+    parser.add_argument('-r', '--reader', choices=['stream', 'mmap', 'index'],
+                        default='stream',
+                        help='read the pileup file line by line (stream), scan the '
+                             'memory-mapped bytes (mmap) or read only the exons using '
+                             'a positional index of the sorted pileup file (index)')
+    parser.add_argument('--histogram', action='store_true',
+                        help='only keep a coverage histogram per gene (constant memory) '
+                             'and write the median, percentiles and breadth of coverage')
+    parser.add_argument('-p', '--progress', type=float, default=2.0,
+                        help='seconds between progress reports on standard error, '
+                             '0 turns them off')
+    parser.add_argument('-m', '--metrics', type=str,
+                        help='name of a file to write the progress metrics to as JSON lines')
+
+    parsed_args = parser.parse_args(args[1:])
+    bed_file = parsed_args.bed_file
+    pileup_file = parsed_args.pileup_file
+    output_file = parsed_args.output_file
+    workers = parsed_args.workers
+    reader = parsed_args.reader
+    histograms = parsed_args.histogram
+    progress_interval = parsed_args.progress
+    metrics_file = parsed_args.metrics
+
+    if not bed_file.lower().endswith('.bed'):
+        print('Warning: given BED file does not have a ".bed" extension.')
+    if not pileup_file.lower().endswith(('.pileup', '.pileup.gz', '.pileup.bgz')):
+        print('Warning: given pileup file does not have a ".pileup" extension.')
 
     # STEP 1: Read BED data
     print('Reading BED data from', bed_file)
@@ -206,13 +980,33 @@ def main(args):
     else:
         print('\t> A total of', len(bed_data), 'lines have been read.\n')
 
-    # STEP 2: Read Pileup data
-    print('Reading pileup data from', pileup_file)
-    pileup_data = read_data(pileup_file)
-    if pileup_data is None:
-        print('No Pileup-data read...')
-    else:
-        print('\t> A total of', len(pileup_data), 'lines have been read.\n')
+    # STEP 2: Open Pileup data, the lines are read while parsing in step 4
+    print('Streaming pileup data from', pileup_file)
+    pileup_stats = {}
+    if compressed_input.is_compressed(pileup_file) and (reader != 'stream' or workers > 1):
+        print('\t> Warning: a compressed pileup file can only be read by a single',
+              'process using the stream reader.')
+        reader = 'stream'
+        workers = 1
+    if reader == 'index':
+        print('\t> Only the exons will be read using the index',
+              position_index.index_filename(pileup_file))
+        if workers > 1:
+            print('\t> Warning: --workers is not used together with the index reader.')
+            workers = 1
+    elif workers > 1:
+        print('\t> Using', workers, 'worker processes.')
+    elif reader == 'stream':
+        pileup_data = stream_data(pileup_file, pileup_stats)
+    print('\t> The pileup file contains', os.path.getsize(pileup_file), 'bytes.\n')
+
+    progress = None
+    if progress_interval > 0 or metrics_file is not None:
+        progress = ProgressReporter(total_bytes=compressed_input.uncompressed_size(pileup_file),
+                                    stats=pileup_stats,
+                                    interval=progress_interval or 2.0,
+                                    output=sys.stderr if progress_interval > 0 else None,
+                                    metrics_file=metrics_file)
 
     # STEP 3: Parsing BED data
     print('Parsing BED data...')
@@ -224,19 +1018,42 @@ def main(args):
 
     # STEP 4: Parsing and filtering pileup data
     print('Parsing and filtering pileup-data...')
-    coverage_dict = parse_pileup_data(pileup_data, bed_dict)
+    start_time = time.perf_counter()
+    if workers > 1:
+        coverage_dict = parse_pileup_parallel(pileup_file, bed_dict, workers,
+                                              pileup_stats, reader, histograms, progress)
+    elif reader == 'mmap':
+        coverage_dict = scan_pileup(pileup_file, bed_dict, stats=pileup_stats,
+                                    histograms=histograms, progress=progress)
+    elif reader == 'index':
+        coverage_dict = fetch_pileup(pileup_file, bed_dict, stats=pileup_stats,
+                                     histograms=histograms)
+    else:
+        coverage_dict = parse_pileup_data(pileup_data, bed_dict, progress=progress,
+                                          histograms=histograms)
+    seconds = max(time.perf_counter() - start_time, 1e-9)
     if coverage_dict is None:
         print('Pileup data not parsed!')
     else:
+        print('\t> A total of', pileup_stats['lines'], 'lines (',
+              pileup_stats['bytes'], 'bytes) have been read.')
+        print('\t> Throughput: {:.0f} lines/s, {:.1f} MB/s'.format(
+            pileup_stats['lines'] / seconds, pileup_stats['bytes'] / seconds / 1e6))
         print('\t> Coverage of', len(coverage_dict.keys()), 'genes have been stored.\n')
 
     # STEP 5: Store calculated data
     print('Calculating coverage statistics...')
-    coverage_statistics = calculate_mapping_coverage(coverage_dict)
+    if histograms:
+        # The first row holds the column names
+        coverage_statistics = calculate_coverage_distribution(coverage_dict)
+        number_of_genes = len(coverage_statistics) - 1
+    else:
+        coverage_statistics = calculate_mapping_coverage(coverage_dict)
+        number_of_genes = len(coverage_statistics)
     if coverage_statistics is None:
         print('No coverage statistics calculated!')
     else:
-        print('\t> Statistics for', len(coverage_statistics), 'genes have been calculated.\n')
+        print('\t> Statistics for', number_of_genes, 'genes have been calculated.\n')
 
     # STEP 6: Write output data
     print('Writing the coverage statistics to', output_file)
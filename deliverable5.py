@@ -12,12 +12,19 @@ Make changes to the `parse_vcf_data` function AND the `main` function,
 following the instructions preceded with double '##' symbols.
 
     usage:
-        python3 deliverable5.py vcf_file.vcf frequency out_file.vcf
+        python3 deliverable5.py [-f filter] [-w workers] [-s samples] [-b bed_file]
+                                vcf_file.vcf frequency out_file.vcf
 
     arguments:
         vcf_file.vcf: the input VCF file, output from the varscan tool
-                      frequency: a number (integer) to use as filtering value
+                      frequency: a number (integer) to use as filtering value,
+                      or a comma separated list of numbers (one output per value)
         out_file.vcf: name of the output VCF file
+        filter: extra filter conditions, see `VcfFilter`
+        workers: number of processes used to filter the file
+        samples: 'first' to only check the first sample, 'any', 'all' or the
+                 minimum number of samples that must pass
+        bed_file: only filter the variants within the regions of this BED file
 
     output:
         a VCF file containing the complete header (comment lines) and
@@ -31,37 +38,569 @@ __version__ = "2019.d5.v1"
 
 # IMPORT
 import sys
+import os
+import io
+import re
+import operator
 import argparse
+from bisect import bisect_left, bisect_right
+from multiprocessing import Pool
+import compressed_input
+import position_index
+from deliverable4 import read_data, parse_bed_data, merge_exons
 
+# Columns of a VCF record
+QUAL_COLUMN = 5
+INFO_COLUMN = 7
+FORMAT_COLUMN = 8
+SAMPLE_COLUMN = 9
 
-def parse_vcf_data(vcf_input_file, frequency, vcf_output_file):
+# Size of the output buffer, so the output is written in large blocks
+WRITE_BUFFER = 4 * 1024 * 1024
+# Maximum size of a chunk filtered by a worker process
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# The comparison operators of a filter expression (longest first)
+OPERATORS = {'>=': operator.ge, '<=': operator.le, '==': operator.eq,
+             '!=': operator.ne, '>': operator.gt, '<': operator.lt, '=': operator.eq}
+FILTER_CLAUSE = re.compile(r'^(INFO[.:])?(\w+)\s*(?:(>=|<=|==|!=|>|<|=)\s*(\S+))?$')
+
+
+class VcfFilter:
+    """
+    A filter for VCF records, compiled once from a filter expression.
+
+    The expression holds one or more clauses separated by ',' or 'and', a
+    record passes the filter if all clauses are true. A clause compares a
+    field with a value using >, >=, <, <=, == or !=, for example:
+
+        FREQ>30, DP>=10, QUAL>20, INFO.ADP>=15, GT==0/1
+
+    QUAL is the quality column, INFO.<key> a key from the INFO column and
+    every other name a FORMAT key of the sample. A '%' after a number is
+    ignored. A clause without comparison (e.g. INFO.SOMATIC) only checks
+    that the field is present. Records with a missing ('.') or absent
+    field do not pass.
+
+    The position of the used keys is cached for every distinct FORMAT
+    string, so the FORMAT column is split only once per layout.
+
+    By default the FORMAT clauses are checked for the first sample. For
+    multi-sample files `record_passes` and `passing_samples` check the
+    QUAL and INFO clauses once and the FORMAT clauses for every sample.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.format_keys = []
+        self.format_cache = {}
+        self.clauses = []
+
+        for clause in re.split(r',|\band\b', expression):
+            clause = clause.strip()
+            if clause:
+                self.clauses.append(self._compile_clause(clause))
+
+        # The FORMAT clauses, checked per sample, and the other clauses
+        self.sample_clauses = [(key, test) for source, key, test in self.clauses
+                               if source == 'FORMAT']
+        self.record_clauses = [clause for clause in self.clauses if clause[0] != 'FORMAT']
+
+    def _compile_clause(self, clause):
+        """
+        Compiles a single clause to a (source, key, test) tuple, where the
+        test is a function of the raw field value (bytes)
+        """
+        match = FILTER_CLAUSE.match(clause)
+        if match is None:
+            raise ValueError('Invalid filter clause: {}'.format(clause))
+        info, key, compare, value = match.groups()
+
+        if info:
+            source = 'INFO'
+        elif key == 'QUAL':
+            source = 'QUAL'
+        else:
+            source = 'FORMAT'
+            if key not in self.format_keys:
+                self.format_keys.append(key)
+            key = self.format_keys.index(key)
+
+        # Only check if the field is present
+        if compare is None:
+            return source, key, lambda raw: raw is not None and raw != b'.'
+
+        compare = OPERATORS[compare]
+        try:
+            number = float(value.rstrip('%'))
+        except ValueError:
+            # Compare text values
+            text = value.encode()
+            return source, key, lambda raw: raw is not None and compare(raw, text)
+
+        def test(raw):
+            if raw is None or raw == b'.':
+                return False
+            try:
+                return compare(float(raw.rstrip(b'%')), number)
+            except ValueError:
+                return False
+        return source, key, test
+
+    def format_indices(self, form):
+        """
+        Returns the position of every used FORMAT key in the given FORMAT
+        column (None if absent), the positions are cached per FORMAT string
+        """
+        indices = self.format_cache.get(form)
+        if indices is None:
+            names = form.split(b':')
+            indices = tuple(names.index(key.encode()) if key.encode() in names else None
+                            for key in self.format_keys)
+            self.format_cache[form] = indices
+        return indices
+
+    def sample_values(self, fields, column=SAMPLE_COLUMN):
+        """
+        Returns the raw values of the used FORMAT keys for the sample in
+        the given column of a split record
+        """
+        values = fields[column].rstrip(b'\r\n').split(b':')
+        return [values[index] if index is not None and index < len(values) else None
+                for index in self.format_indices(fields[FORMAT_COLUMN])]
+
+    def __call__(self, fields, sample=None):
+        """
+        Checks if a record passes the filter
+
+        Args:
+            fields (List): The record split on tabs (bytes), at least up to
+                           the first sample column
+            sample (List): The values from `sample_values`, if these are
+                           already known
+        Return:
+            (Bool): True if the record passes all clauses
+        """
+        info = None
+        for source, key, test in self.clauses:
+            if source == 'FORMAT':
+                if sample is None:
+                    sample = self.sample_values(fields)
+                raw = sample[key]
+            elif source == 'QUAL':
+                raw = fields[QUAL_COLUMN]
+            else:
+                if info is None:
+                    info = parse_info(fields[INFO_COLUMN])
+                raw = info.get(key)
+            if not test(raw):
+                return False
+        return True
+
+    def record_passes(self, fields):
+        """
+        Checks only the QUAL and INFO clauses for a record
+
+        Args:
+            fields (List): The record split on tabs (bytes)
+        Return:
+            (Bool): True if the record passes all QUAL and INFO clauses
+        """
+        info = None
+        for source, key, test in self.record_clauses:
+            if source == 'QUAL':
+                raw = fields[QUAL_COLUMN]
+            else:
+                if info is None:
+                    info = parse_info(fields[INFO_COLUMN])
+                raw = info.get(key)
+            if not test(raw):
+                return False
+        return True
+
+    def passing_samples(self, fields):
+        """
+        Checks the FORMAT clauses for every sample of a record. The FORMAT
+        column is looked up once, every sample column is split once.
+
+        Args:
+            fields (List): The record completely split on tabs (bytes)
+        Return:
+            (List): Per sample column True if the sample passes all
+                    FORMAT clauses
+        """
+        indices = self.format_indices(fields[FORMAT_COLUMN])
+        clauses = self.sample_clauses
+        passes = []
+        for column in range(SAMPLE_COLUMN, len(fields)):
+            values = fields[column].rstrip(b'\r\n').split(b':')
+            count = len(values)
+            passes.append(all(test(values[indices[key]]
+                                   if indices[key] is not None and indices[key] < count
+                                   else None)
+                              for key, test in clauses))
+        return passes
+
+
+def parse_info(info):
+    """
+    Parses the INFO column of a record (bytes) into a dictionary, flags
+    get the value b'' """
+    values = {}
+    for item in info.split(b';'):
+        key, _, value = item.partition(b'=')
+        values[key.decode()] = value
+    return values
+
+
+def strip_chr(chrom):
+    """ Returns the chromosome name without 'chr' prefix, so BED and VCF
+    chromosome names can be compared """
+    return chrom[3:] if chrom.startswith('chr') else chrom
+
+
+def bed_regions(bed_dict):
+    """ Converts BED data (as parsed by `parse_bed_data`) to a dictionary
+    with per chromosome (without 'chr' prefix) the sorted, non-overlapping
+    (start, stop) regions """
+    exons = {}
+    for chrom, chrom_exons in bed_dict.items():
+        exons.setdefault(strip_chr(chrom), []).extend(chrom_exons)
+    return {chrom: merge_exons(chrom_exons) for chrom, chrom_exons in exons.items()}
+
+
+def in_regions(regions, pos):
+    """ Checks if `pos` lies within one of the sorted (start, stop) regions """
+    region = bisect_right(regions, (pos, float('inf'))) - 1
+    return region >= 0 and pos < regions[region][1]
+
+
+def query_vcf(vcf_file, bed_dict, stats=None, index=None):
+    """ Generator that yields the records (bytes) of a coordinate-sorted,
+    uncompressed VCF file with a position within the intervals of the BED
+    data (start <= POS < stop), as parsed by `parse_bed_data`.
+
+    The records are read by seeking directly to each interval using the
+    positional index of the VCF file (see `position_index`), which is built
+    first if it does not exist yet and no `index` is given. Records are
+    yielded once, in file order. If a `stats` dictionary is given, the
+    number of 'lines' and 'bytes' read are added to it.
+    """
+    regions = bed_regions(bed_dict)
+    if index is None:
+        index = position_index.get_index(vcf_file)
+
+    with open(vcf_file, 'rb') as file_data:
+        for raw_chrom in index['chromosomes']:
+            for start, stop in regions.get(strip_chr(raw_chrom), ()):
+                yield from position_index.fetch_lines(file_data, index, raw_chrom,
+                                                      start, stop, stats)
+
+
+def region_lines(vcf_data, vcf_input_file, bed_dict):
+    """ Generator that yields the header lines of the opened VCF file followed
+    by the records within the intervals of the BED data. Uncompressed files
+    are queried with `query_vcf`, compressed and unsorted files are read
+    completely. """
+    for line in vcf_data:
+        if not line.startswith(b'#'):
+            break
+        yield line
+    else:
+        return
+
+    if not compressed_input.is_compressed(vcf_input_file):
+        try:
+            index = position_index.get_index(vcf_input_file)
+        except ValueError as error:
+            print('Warning: {}, checking the position of every record.'.format(error))
+        else:
+            yield from query_vcf(vcf_input_file, bed_dict, index=index)
+            return
+
+    # Check the position of every record, starting with the current line
+    regions = bed_regions(bed_dict)
+    while line:
+        fields = line.split(b'\t', 2)
+        chrom_regions = regions.get(strip_chr(fields[0].decode()))
+        if chrom_regions and in_regions(chrom_regions, int(fields[1])):
+            yield line
+        line = vcf_data.readline()
+
+
+def build_filter(frequency, expression=None):
+    """ Returns the `VcfFilter` for the frequency threshold combined with the
+    optional filter expression """
+    return VcfFilter('FREQ>{}'.format(frequency) + (',' + expression if expression else ''))
+
+
+def filter_lines(lines, vcf_filter, counts):
+    """ Generator that yields the lines (bytes) that pass the filter, header
+    lines are always passed. The number of 'records' and 'passed' records are
+    added to `counts`. """
+    for line in lines:
+        # Pass the comment-lines (header) directly
+        if line.startswith(b'#'):
+            yield line
+
+        # Compare the fields with the filter and pass the line
+        # if it passes (FREQ > frequency)
+        else:
+            counts['records'] += 1
+            if vcf_filter(line.split(b'\t', SAMPLE_COLUMN + 1)):
+                counts['passed'] += 1
+                yield line
+
+
+def parse_vcf_data(vcf_input_file, frequency, vcf_output_file, expression=None,
+                   bed_dict=None):
     """ This function reads the input VCF file line by line, skipping the first
     n-header lines. The remaining lines are parsed to filter out variant allele
-    frequencies > frequency.
+    frequencies > frequency. The input VCF file may be gzip or BGZF compressed.
+
+    More conditions can be given as a filter `expression` (see `VcfFilter`),
+    these are combined with the frequency condition. Passing records are
+    written as the original bytes. If BED data is given (see `parse_bed_data`)
+    only the records within its intervals are read, see `region_lines`.
+    Returns the number of 'records' read and the number that 'passed' the
+    filter.
     """
+    vcf_filter = build_filter(frequency, expression)
+    counts = {'records': 0, 'passed': 0}
 
     # Open the INTPUT VCF file, read the contents line-by-line
-    with open(vcf_input_file) as vcf_data:
+    with compressed_input.open_input(vcf_input_file, 'rb') as vcf_data:
+        if bed_dict is not None:
+            vcf_data = region_lines(vcf_data, vcf_input_file, bed_dict)
 
         # Open the Output VCF file, add the good lines in the file
-        with open(vcf_output_file, "w") as output:
+        with open(vcf_output_file, 'wb', buffering=WRITE_BUFFER) as output:
+            output.writelines(filter_lines(vcf_data, vcf_filter, counts))
+
+    return counts
+
+
+def sweep_filename(vcf_output_file, threshold):
+    """ Returns the output filename for a single threshold of a sweep, e.g.
+    'out.vcf' becomes 'out_30.vcf' """
+    root, extension = os.path.splitext(vcf_output_file)
+    return '{}_{}{}'.format(root, threshold, extension)
+
+
+def parse_vcf_sweep(vcf_input_file, frequencies, vcf_output_file, expression=None,
+                    bed_dict=None):
+    """ This function filters the input VCF file for several frequency
+    thresholds at once, reading the file only once. For every threshold an
+    output file is written (see `sweep_filename`) with the header and the
+    records with FREQ > threshold that pass the filter `expression`.
+
+    The FREQ of a record is parsed once and the record is written to every
+    output it qualifies for. See `parse_vcf_data` for `bed_dict`. Returns the
+    number of 'records' read and a dictionary with the number of passed
+    records per threshold.
+    """
+    sorted_frequencies = sorted(set(frequencies))
+    # FREQ is the first FORMAT key of the filter, records without it never pass
+    vcf_filter = VcfFilter('FREQ' + (',' + expression if expression else ''))
+    counts = [0] * len(sorted_frequencies)
+    records = 0
+
+    outputs = [open(sweep_filename(vcf_output_file, threshold), 'wb', buffering=WRITE_BUFFER)
+               for threshold in sorted_frequencies]
+    try:
+        with compressed_input.open_input(vcf_input_file, 'rb') as vcf_data:
+            if bed_dict is not None:
+                vcf_data = region_lines(vcf_data, vcf_input_file, bed_dict)
+            for line in vcf_data:
+                # Write the header to all output files
+                if line.startswith(b'#'):
+                    for output in outputs:
+                        output.write(line)
+                    continue
+
+                records += 1
+                fields = line.split(b'\t', SAMPLE_COLUMN + 1)
+                sample = vcf_filter.sample_values(fields)
+                if not vcf_filter(fields, sample):
+                    continue
+                try:
+                    freq = float(sample[0].rstrip(b'%'))
+                except ValueError:
+                    continue
+
+                # The record passes all thresholds below its frequency
+                for i in range(bisect_left(sorted_frequencies, freq)):
+                    counts[i] += 1
+                    outputs[i].write(line)
+    finally:
+        for output in outputs:
+            output.close()
+
+    return {'records': records, 'passed': dict(zip(sorted_frequencies, counts))}
+
+
+def parse_vcf_samples(vcf_input_file, frequency, vcf_output_file, samples='any',
+                      expression=None, bed_dict=None):
+    """ This function filters a (multi-sample) VCF file on the FREQ of all
+    sample columns. The FORMAT conditions (FREQ > frequency and those of the
+    filter `expression`) are checked for every sample, the QUAL and INFO
+    conditions once per record. A record is written if enough samples pass:
+    `samples` is 'any', 'all' or the minimum number of passing samples.
+
+    Every record is read once, the number of records each sample passes
+    for are counted along the way. See `parse_vcf_data` for `bed_dict`.
+    Returns the number of 'records' read, the number that 'passed' and a
+    dictionary with the pass count per sample name. Raises a ValueError if
+    the file has no #CHROM header line before the first record, or a record
+    has more sample columns than the header.
+    """
+    vcf_filter = build_filter(frequency, expression)
+    counts = {'records': 0, 'passed': 0}
+    sample_names = None
+    sample_counts = []
+    required = 1 if samples == 'any' else samples
+
+    with compressed_input.open_input(vcf_input_file, 'rb') as vcf_data:
+        if bed_dict is not None:
+            vcf_data = region_lines(vcf_data, vcf_input_file, bed_dict)
+
+        with open(vcf_output_file, 'wb', buffering=WRITE_BUFFER) as output:
             for line in vcf_data:
-                # Write the first ... comment-lines (header) directly to the output file
-                if line.startswith("#"):
+                if line.startswith(b'#'):
+                    # The column header holds the sample names
+                    if line.startswith(b'#CHROM'):
+                        sample_names = line.rstrip(b'\r\n').decode().split('\t')[SAMPLE_COLUMN:]
+                        sample_counts = [0] * len(sample_names)
+                        if samples == 'all':
+                            required = len(sample_names)
                     output.write(line)
+                    continue
+
+                counts['records'] += 1
+                if sample_names is None:
+                    raise ValueError('{} has no #CHROM header line with the sample names'
+                                     .format(vcf_input_file))
+                fields = line.split(b'\t')
+                if len(fields) - SAMPLE_COLUMN > len(sample_names):
+                    raise ValueError('Record {} of {} has {} sample columns, the header has {}'
+                                     .format(counts['records'], vcf_input_file,
+                                             len(fields) - SAMPLE_COLUMN, len(sample_names)))
+                if not vcf_filter.record_passes(fields):
+                    continue
 
-                # Compare the 'FREQ' field with the `frequency` value and write the line
-                else:
-                    line = line.split("\t")
-                    formats = line[8].split(":")
-                    index_freq = 0
-                    for index, form in enumerate(formats):
-                        if form == "FREQ":
-                            index_freq = index
-                    freq = line[9].split(":")[index_freq]
-                    # to the output file if FREQ > frequency
-                    if float(freq.replace("%", "")) > frequency:
-                        output.write("\t".join(line))
+                passes = vcf_filter.passing_samples(fields)
+                for sample_nr, sample_passes in enumerate(passes):
+                    if sample_passes:
+                        sample_counts[sample_nr] += 1
+                if passes.count(True) >= max(required, 1):
+                    counts['passed'] += 1
+                    output.write(line)
+
+    counts['samples'] = dict(zip(sample_names, sample_counts))
+    return counts
+
+
+def split_body(filename, number):
+    """ Function that splits the records of a VCF file in line-aligned byte
+    ranges of about equal size. There are at least `number` ranges (if the
+    file is large enough) and none is larger than about `CHUNK_SIZE`.
+
+    Returns the offset where the header ends and a list of (start, stop)
+    byte offsets.
+    """
+    size = os.path.getsize(filename)
+
+    with open(filename, 'rb') as file_data:
+        # The header ends at the first line not starting with '#'
+        body_start = 0
+        for line in file_data:
+            if not line.startswith(b'#'):
+                break
+            body_start += len(line)
+
+        number = max(number, (size - body_start) // CHUNK_SIZE + 1)
+        borders = [body_start]
+        for i in range(1, number):
+            # Move to the first line starting at or after the split point
+            file_data.seek(max(body_start + (size - body_start) * i // number - 1, 0))
+            file_data.readline()
+            borders.append(max(file_data.tell(), borders[-1]))
+    borders.append(size)
+
+    return body_start, [(start, stop) for start, stop in zip(borders, borders[1:])
+                        if start < stop]
+
+
+# Filter shared by all worker processes of `parse_vcf_parallel`
+_WORKER_FILTER = {}
+
+
+def _init_worker(frequency, expression):
+    """ Compiles the filter once in each worker process """
+    _WORKER_FILTER['filter'] = build_filter(frequency, expression)
+
+
+def _filter_chunk(chunk):
+    """ Filters a single (filename, start, stop) chunk in a worker process,
+    returns the passing lines joined together and the counts """
+    filename, start, stop = chunk
+    counts = {'records': 0, 'passed': 0}
+
+    with open(filename, 'rb') as file_data:
+        file_data.seek(start)
+        # Split on newlines only, like reading the file line by line
+        lines = io.BytesIO(file_data.read(stop - start))
+
+    return b''.join(filter_lines(lines, _WORKER_FILTER['filter'], counts)), counts
+
+
+def parse_vcf_parallel(vcf_input_file, frequency, vcf_output_file, workers,
+                       expression=None):
+    """ Function that filters a VCF file with a pool of `workers` processes.
+
+    The header is copied once, the records are split in line-aligned chunks
+    that are filtered independently. The passing records are written in the
+    original order, so the output is identical to `parse_vcf_data`, which
+    is used for compressed input files. Returns the same counts.
+    """
+    if compressed_input.is_compressed(vcf_input_file):
+        return parse_vcf_data(vcf_input_file, frequency, vcf_output_file, expression)
+
+    counts = {'records': 0, 'passed': 0}
+    body_start, chunks = split_body(vcf_input_file, workers * 4)
+
+    with open(vcf_output_file, 'wb', buffering=WRITE_BUFFER) as output:
+        # Copy the header
+        with open(vcf_input_file, 'rb') as vcf_data:
+            output.write(vcf_data.read(body_start))
+
+        with Pool(workers, initializer=_init_worker,
+                  initargs=(frequency, expression)) as pool:
+            for data, chunk_counts in pool.imap(
+                    _filter_chunk, [(vcf_input_file, start, stop) for start, stop in chunks]):
+                output.write(data)
+                counts['records'] += chunk_counts['records']
+                counts['passed'] += chunk_counts['passed']
+
+    return counts
+
+
+def sample_mode(value):
+    """ Converts the --samples argument to 'any', 'all' or an int """
+    if value in ('first', 'any', 'all'):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid sample mode: {}'.format(value))
+
+
+def thresholds(value):
+    """ Converts a comma separated list of frequency thresholds to a list of ints """
+    try:
+        return [int(threshold) for threshold in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid frequency: {}'.format(value))
 
 
 # MAIN
@@ -73,10 +612,20 @@ def main(args):
                     'frequency is above the given frequency value from the given vcf file')
     parser.add_argument('vcf_file', nargs='?', default='data/example.vcf',
                         type=str, help='name of the vcf input file')
-    parser.add_argument('frequency', nargs='?', type=int, default=30,
-                        help='give a number to use as filtering value')
+    parser.add_argument('frequency', nargs='?', type=thresholds, default='30',
+                        help='give a number to use as filtering value, or a comma '
+                             'separated list of numbers for one output file per value')
     parser.add_argument('out_vcf', nargs='?', default='data/d5_output.vcf',
                         type=str, help='give name for your output file')
+    parser.add_argument('-f', '--filter', type=str,
+                        help='extra filter conditions, e.g. "DP>=10,QUAL>20,INFO.ADP>=15"')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of worker processes (default: 1)')
+    parser.add_argument('-s', '--samples', type=sample_mode, default='first',
+                        help="which samples must pass: 'first' (default), 'any', 'all' "
+                             "or the minimum number of samples")
+    parser.add_argument('-b', '--bed', type=str,
+                        help='BED file, only variants within its regions are filtered')
 
     # Give warning when the default values of the arguments are used
     if len(args) == 1:
@@ -84,12 +633,38 @@ def main(args):
 
     # Create variables for each argument
     args = parser.parse_args()
+    if len(args.frequency) > 1 and (args.workers > 1 or args.samples != 'first'):
+        parser.error('a frequency sweep can not be combined with -w/--workers or -s/--samples')
+    if args.workers > 1 and (args.bed or args.samples != 'first'):
+        parser.error('-w/--workers can not be combined with -b/--bed or -s/--samples')
     vcf_file = args.vcf_file
     frequency = args.frequency
     out_vcf = args.out_vcf
 
+    bed_dict = None
+    if args.bed:
+        bed_dict = parse_bed_data(read_data(args.bed))
+
     # Process the VCF-file
-    parse_vcf_data(vcf_file, frequency, out_vcf)
+    if len(frequency) > 1:
+        counts = parse_vcf_sweep(vcf_file, frequency, out_vcf, args.filter, bed_dict)
+        print('Threshold\tVariants\tOutput file ({} variants read)'.format(counts['records']))
+        for threshold, passed in counts['passed'].items():
+            print('{}\t{}\t{}'.format(threshold, passed, sweep_filename(out_vcf, threshold)))
+        return 0
+
+    frequency = frequency[0]
+    if args.samples != 'first':
+        counts = parse_vcf_samples(vcf_file, frequency, out_vcf, args.samples, args.filter,
+                                   bed_dict)
+        print('Sample\tVariants')
+        for sample, passed in counts['samples'].items():
+            print('{}\t{}'.format(sample, passed))
+    elif args.workers > 1:
+        counts = parse_vcf_parallel(vcf_file, frequency, out_vcf, args.workers, args.filter)
+    else:
+        counts = parse_vcf_data(vcf_file, frequency, out_vcf, args.filter, bed_dict)
+    print(counts['passed'], 'of', counts['records'], 'variants written to', out_vcf)
 
     return 0
 
@@ -6,61 +6,131 @@ script that parses the ANNOVAR data into a Dictionary object
 
 import sys
 import json
-from operator import itemgetter
+import argparse
+import compressed_input
+import annovar_cache
 
+# Define the columns of interest, by header name (case-insensitive) or by position
+# in the Galaxy ANNOVAR output. The prediction columns after LJB2_PolyPhen2_HDIV
+# are named differently per ANNOVAR version and are selected by position.
+COLUMNS = ['Begin', 'Reference', 'Func', 'RefSeq_Func', 'RefSeq_Gene', 'dbSNP138',
+           'LJB2_SIFT', 'LJB2_PolyPhen2_HDIV', *range(32, 36), 'CLINVAR']
 
-def parse_annovar(filename):
+# Columns (lowercase names) with few distinct values, their values are interned
+# so every distinct value is only stored once
+INTERNED_COLUMNS = ('reference', 'func', 'refseq_func', 'refseq_gene', 'clinvar')
+
+
+class AnnovarTable:
     """
-    Loops thru the annovar file and creates a dictionary from its contents
-    :param filename: The file location of the annovar file
-    :return: A list of dictionaries witch contain all the annovar data
+    The selected columns of an ANNOVAR file, stored column-wise. The rows
+    are only created (as dictionaries with column: value) when they are
+    requested, by index or by iterating over the table.
     """
-    header = []
-    annovar_data = []
 
-    with open(filename) as data:
-        for i, variant in enumerate(data):
+    def __init__(self, names, columns=None):
+        """
+        :param names: The names of the columns in the table
+        :param columns: The values per column, by default empty lists
+        """
+        self.names = list(names)
+        self.columns = columns if columns is not None else [[] for _ in self.names]
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        return dict(zip(self.names, [column[index] for column in self.columns]))
+
+    def __iter__(self):
+        for values in zip(*self.columns):
+            yield dict(zip(self.names, values))
 
-            # Get header if we're processing the first line
-            if i == 0:
-                header = process_annovar_line(variant, header=False)
-                continue
+    def column(self, name):
+        """
+        :param name: The name of a column
+        :return: The list with all values of the column
+        """
+        return self.columns[self.names.index(name)]
 
-            # Process the data and add to a list
-            annovar_data.append(process_annovar_line(variant, header))
 
-    return annovar_data
+def resolve_columns(header, columns):
+    """
+    Looks up the position of the wanted columns in the header, once per file
+    :param header: The column names of the ANNOVAR file
+    :param columns: The wanted columns, by name (case-insensitive) or position
+    :return: A list with the position of each wanted column
+    """
+    names = [name.lower() for name in header]
+    positions = []
+    for column in columns:
+        if isinstance(column, int):
+            positions.append(column)
+        elif column.lower() in names:
+            # Use the first column with this name
+            positions.append(names.index(column.lower()))
+        else:
+            raise ValueError('Column {} is not in the ANNOVAR header'.format(column))
+    return positions
+
+
+def parse_annovar(filename, columns=None, cache_dir=None):
+    """
+    Loops thru the annovar file and stores the wanted columns in a table
+    :param filename: The file location of the annovar file, the file may be
+                     gzip or BGZF compressed
+    :param columns: The wanted columns, by name or position (default `COLUMNS`)
+    :param cache_dir: If given, the parsed table is stored in and read from
+                      this cache directory, see `annovar_cache`
+    :return: An AnnovarTable witch contains the annovar data, iterating over
+             it gives a dictionary per variant
+    """
+    if columns is None:
+        columns = COLUMNS
 
+    if cache_dir is not None:
+        def parse():
+            table = parse_annovar(filename, columns)
+            return table.names, table.columns
 
-def process_annovar_line(variant, header):
-    """ Given a list of column indices, parse the header and all data lines """
-    # Define the columns of interest
-    columns = [1, 3, *range(8, 11), *range(15, 16), *range(30, 36), 53]
+        return AnnovarTable(*annovar_cache.load_columns(filename, repr(columns), parse,
+                                                        cache_dir))
 
-    data = variant.split("\t")
+    with compressed_input.open_input(filename) as data:
+        # Get the header and find the wanted columns
+        header = [field.strip() for field in next(data).split("\t")]
+        positions = resolve_columns(header, columns)
+        table = AnnovarTable(header[position] for position in positions)
 
-    print(*columns)
-    # Extract values for selected columns
-    annotation_values = itemgetter(*columns)(data)
+        # Only split the lines up to the last wanted column
+        max_split = max(positions) + 1
+        appends = [(position, column.append, name.lower() in INTERNED_COLUMNS)
+                   for position, column, name in zip(positions, table.columns, table.names)]
 
-    # Return list of values if header is requested
-    if not header:
-        return annotation_values
+        # Process the data and add the values to the columns
+        intern = sys.intern
+        for variant in data:
+            data_fields = variant.split("\t", max_split)
+            for position, append, interned in appends:
+                value = data_fields[position].strip()
+                append(intern(value) if interned else value)
 
-    # Return all data as a dictionary with column: value
-    return dict(
-                zip(
-                    [field.strip() for field in header],
-                    [field.strip() for field in annotation_values]
-                )
-    )
+    return table
 
 
 def main():
     """ Main function for processing Annovar annotation data """
+    parser = argparse.ArgumentParser(description='Prints the wanted columns of an ANNOVAR file '
+                                                 'as JSON')
+    parser.add_argument('file', nargs='?',
+                        default='data/Galaxy15-[_ANNOVAR_Annotated_variants_on_data_13].tabular',
+                        help='the ANNOVAR file')
+    parser.add_argument('-c', '--cache_dir', type=str,
+                        help='store the parsed file in (and read it from) this cache directory')
+    args = parser.parse_args()
 
     # Pretty-print the dictionary as JSON object
-    print(json.dumps(parse_annovar('data/Galaxy15-[_ANNOVAR_Annotated_variants_on_data_13].tabular')
+    print(json.dumps(list(parse_annovar(args.file, cache_dir=args.cache_dir))
                      , indent=4))
 
     return 0
@@ -21,7 +21,7 @@ __version__ = "2019.d7.v1"
 
 # IMPORT
 import sys
-import re
+import gene_names
 
 
 def get_gene_name(gene_name):
@@ -33,22 +33,8 @@ def get_gene_name(gene_name):
     Returns:
         gene (String): The filtered gene name
     """
-    # Regular Expression Link to explenation: https://regex101.com/r/UPDa0e/5
-    reg_ex = r"((?=LOC)[A-Z0-9\-]+|(?=LIN)[A-Z0-9\-]+|NONE|\([^)]*\))?(?(1)|([A-Z0-9\-]+))"
-
-    # Finding all matches with the regular expression
-    match_tuple = re.finditer(reg_ex, gene_name, re.IGNORECASE)
-
-    # Setting the values of group 2 in a list if the values are not empty string
-    match = [match.group(2)
-             for match in match_tuple
-             if match.group(2) != "" and match.group(2) is not None]
-
-    if match:
-        gene = "/".join(match)
-    else:
-        gene = "-"
-    return gene
+    # The filtering is shared with deliverable 9, see `gene_names`
+    return gene_names.get_gene_name(gene_name)
 
 
 ######
@@ -0,0 +1,52 @@
+/*
+Created by: Nadia Choudhury, Micha Beens
+Status: Finished
+Version: 2019.d8.v3-sqlite
+
+The schema of deliverable8.sql for the SQLite backend of deliverable 9
+*/
+
+/*Dropping the existing tables so we can recreate them*/
+drop table if exists variants;
+drop table if exists genes;
+drop table if exists chromosomes;
+
+/*The table that contains all infromation that is specific to a chromosome*/
+/*Names are unique case insensitive, like the default collation of MySQL*/
+create table chromosomes(
+	chrom_id				integer			primary key,
+	chromosome				varchar(25)		not null        unique      collate nocase
+);
+
+/*The table that contains all information that is specific to genes*/
+create table genes(
+	gene_id					integer			primary key,
+	chrom_id				int             not null,
+	refseq_gene				varchar(255)    not null        unique      collate nocase,
+
+	foreign key(chrom_id)
+	    references chromosomes(chrom_id)
+	        on delete restrict
+);
+
+/*The table that contains all variant infromation that is relevant to our project*/
+create table variants(
+	variant_id				integer			primary key,
+	gene_id					int,
+	begin				    int				not null,
+	reference				char(1)			not null,
+	refseq_func				varchar(255),
+	dbsnp138				varchar(255),
+	"1000g2015aug_eur"		float,
+	ljb2_sift				float,
+	ljb2_polyphen2_hdiv		varchar(20),
+	clinvar					varchar(255),
+
+	foreign key(gene_id)
+	    references genes(gene_id)
+	        on delete restrict
+);
+
+/*MySQL creates these indexes for the foreign keys itself*/
+create index genes_chrom_id on genes(chrom_id);
+create index variants_gene_id on variants(gene_id);
@@ -11,22 +11,75 @@ Deliverable 9
 -------------
 
 Usage:
-    python3 deliverable9.py [-s sql_file] username password hostname database_name annovar_file
+    python3 deliverable9.py [-s sql_file] [-c cache_dir] [-b batch_size]
+                            [--bulk_load] [-w workers] [-q queue_size] [-m metrics_file]
+                            username password hostname database_name annovar_file
+
+    python3 deliverable9.py --sqlite database_file [-s sql_file] [...] annovar_file
 
 """
 
 # METADATA VARIABLES
 __author__ = "Micha Beens, Nadia Choudhury"
 __status__ = "Finished"
-__version__ = "2019.d9.v5"
+__version__ = "2019.d9.v6"
 
 # IMPORTS
 import sys
+import re
+import json
 import argparse
 import os.path
-import re
-from operator import itemgetter
-import mysql.connector
+import time
+import queue
+import sqlite3
+import tempfile
+import threading
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:
+    # Only needed for a MySQL database, not for the SQLite backend
+    mysql = None
+import compressed_input
+import annovar_cache
+import deliverable6
+import gene_names
+
+# The columns of the ANNOVAR file used for the database, by header name (case-insensitive)
+COLUMNS = ['chromosome', 'begin', 'reference', 'refseq_func', 'refseq_gene', 'dbsnp138',
+           '1000g2015aug_eur', 'ljb2_sift', 'ljb2_polyphen2_hdiv', 'clinvar']
+
+# Number of ANNOVAR rows inserted (and committed) at once
+BATCH_SIZE = 1000
+
+# Maximum number of batches waiting for the workers of the parallel loader
+QUEUE_SIZE = 8
+
+# Types of the numeric db columns, the other columns are text
+COLUMN_TYPES = {'begin': int, '1000g2015aug_eur': float, 'ljb2_sift': float}
+# Values of a numeric column that mean there is no value
+MISSING_VALUES = ('', '.')
+# Maximum number of parameters of a prepared statement
+MAX_PARAMETERS = 65535
+
+# Escaped characters and NULL in the staging files of LOAD DATA
+TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+TSV_NULL = '\\N'
+TSV_UNESCAPE = re.compile(r'\\[\\tnr]')
+TSV_UNESCAPES = {'\\\\': '\\', '\\t': '\t', '\\n': '\n', '\\r': '\r'}
+
+# The schema of the SQLite backend, created in a new database file
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deliverable8_sqlite.sql')
+# Settings of every SQLite connection: a write-ahead log (readers do not
+# block the writer), fewer fsyncs, and a 64 MB page cache and 256 MB mmap
+SQLITE_PRAGMAS = ('journal_mode = WAL', 'synchronous = NORMAL', 'foreign_keys = ON',
+                  'temp_store = MEMORY', 'cache_size = -65536', 'mmap_size = 268435456')
+# Seconds a connection waits for the write lock of another connection
+SQLITE_TIMEOUT = 60
+
+# Percentiles of the batch latency in the metrics report
+PERCENTILES = (50, 90, 99)
 
 
 # FUNCTIONS
@@ -44,56 +97,348 @@ def check_file_exists(file):
 
 def check_file_tab_separated(file):
     """
-    Checks if the given file is tab separated
+    Checks if the given file is tab separated, the file may be compressed
 
     Args:
         file (String): The filename of the file
     Return:
         tab_separated (Bool): The value that says if the file is tab separated
     """
-    with open(file) as file_data:
+    with compressed_input.open_input(file) as file_data:
         for line in file_data:
             line = line.split('\t')
             return len(line) > 1
 
 
+def column_list(columns):
+    """
+    Returns the column names as a comma separated list for a SQL statement,
+    the names are quoted because a name like 1000g2015aug_eur is not a
+    valid identifier in SQLite
+
+    Args:
+        columns (List): The names of the columns
+    Return:
+        (String): The quoted column names
+    """
+    return ", ".join("`{}`".format(column) for column in columns)
+
+
+class MySQLBackend:
+    """
+    Storage backend for a MySQL (or MariaDB) server, used by
+    AnnovarDatabaseFiller
+    """
+    name = 'mysql'
+    # Multiple rows are inserted with one multi-row INSERT statement
+    multi_row_insert = True
+
+    def __init__(self, user, password, host, database, allow_local_infile=False):
+        """
+        Args:
+            user (String): The username for the database
+            password (String): The Password of the user for the database
+            host (String): The host adres of de database
+            database (string): The name of the database
+            allow_local_infile (Bool): Allow LOAD DATA LOCAL INFILE, used by
+                                       `bulk_load`
+        """
+        if mysql is None:
+            raise ImportError("mysql-connector-python is needed for a MySQL database")
+        # Keep the settings for the connections of the parallel loader
+        self.settings = {'user': user, 'password': password, 'host': host,
+                         'database': database, 'allow_local_infile': allow_local_infile}
+        self.error = mysql.connector.Error
+
+    def connect(self):
+        """ Returns a new connection to the database """
+        return mysql.connector.connect(**self.settings)
+
+    def connections(self, number):
+        """ Returns `number` connections from a connection pool """
+        connection_pool = pooling.MySQLConnectionPool(pool_name='annovar', pool_size=number,
+                                                      **self.settings)
+        return [connection_pool.get_connection() for _ in range(number)]
+
+    @staticmethod
+    def prepared_cursor(dbcon):
+        """ Returns a cursor for server-side prepared statements """
+        return dbcon.cursor(prepared=True)
+
+    @staticmethod
+    def sql(statement):
+        """ Returns a statement with %s parameters in the style of the backend """
+        return statement
+
+    @staticmethod
+    def describe(cursor, table):
+        """ Returns the names of the columns of a table """
+        cursor.execute("desc %s" % table)
+        return [column[0] for column in cursor.fetchall()]
+
+    @staticmethod
+    def execute_script(dbcon, cursor, script):
+        """ Executes the statements of a SQL file and commits them """
+        # Execute every command from the input file
+        for command in script.strip().split(";"):
+            cursor.execute(command)
+        dbcon.commit()
+
+    @staticmethod
+    def load_file(cursor, table, columns, path):
+        """ Loads a tab separated staging file into a table """
+        cursor.execute("LOAD DATA LOCAL INFILE %s INTO TABLE {0} "
+                       "CHARACTER SET utf8mb4 ({1})".format(table, column_list(columns)),
+                       (path,))
+
+
+class SQLiteBackend:
+    """
+    Embedded storage backend, a SQLite database file, used by
+    AnnovarDatabaseFiller. Everything runs in-process, without a server.
+    A new database file gets the tables of `SQLITE_SCHEMA`.
+    """
+    name = 'sqlite'
+    # A single-row INSERT is executed for all rows with executemany
+    multi_row_insert = False
+    error = sqlite3.Error
+
+    def __init__(self, filename, schema_file=SQLITE_SCHEMA):
+        """
+        Args:
+            filename (String): The SQLite database file, created if it does
+                               not exist
+            schema_file (String): The SQL file with the tables of a new database
+        """
+        self.filename = filename
+        self.schema_file = schema_file
+
+    def connect(self):
+        """ Returns a new connection to the database, with `SQLITE_PRAGMAS` set """
+        # The worker threads of the parallel loader get their own connection,
+        # but it is made by the main thread
+        dbcon = sqlite3.connect(self.filename, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            dbcon.execute("PRAGMA " + pragma)
+
+        if not dbcon.execute("SELECT 1 FROM sqlite_master "
+                             "WHERE type = 'table' AND name = 'variants'").fetchall():
+            with open(self.schema_file) as sql_data:
+                dbcon.executescript(sql_data.read())
+        return dbcon
+
+    def connections(self, number):
+        """ Returns `number` new connections, the writes of SQLite are serialized """
+        return [self.connect() for _ in range(number)]
+
+    @staticmethod
+    def prepared_cursor(dbcon):
+        """ Returns a cursor, sqlite3 keeps the prepared statements of a connection """
+        return dbcon.cursor()
+
+    @staticmethod
+    def sql(statement):
+        """ Returns a statement with %s parameters in the style of the backend """
+        return statement.replace("%s", "?")
+
+    @staticmethod
+    def describe(cursor, table):
+        """ Returns the names of the columns of a table """
+        cursor.execute("PRAGMA table_info({})".format(table))
+        return [column[1] for column in cursor.fetchall()]
+
+    @staticmethod
+    def execute_script(dbcon, cursor, script):
+        """ Executes the statements of a SQL file and commits them """
+        dbcon.executescript(script)
+        dbcon.commit()
+
+    @staticmethod
+    def load_file(cursor, table, columns, path):
+        """ Loads a tab separated staging file into a table, with executemany """
+        def unescape(value):
+            if value == TSV_NULL:
+                return None
+            return TSV_UNESCAPE.sub(lambda escape: TSV_UNESCAPES[escape.group()], value)
+
+        insert = "INSERT INTO {0}({1}) VALUES({2})".format(table, column_list(columns),
+                                                            ", ".join(["?"] * len(columns)))
+        # The values are text, the column types of the table convert them
+        with open(path, encoding='utf-8', newline='\n') as staging_file:
+            cursor.executemany(insert, ([unescape(value) for value in line[:-1].split("\t")]
+                                        for line in staging_file))
+
+
+def percentile(values, percent):
+    """
+    Returns a percentile of sorted values (nearest rank)
+
+    Args:
+        values (List): The sorted values
+        percent (Float): The percentile, from 0 to 100
+    Return:
+        (Float): The value at the percentile, 0 without values
+    """
+    if not values:
+        return 0
+    return values[max(int(-(-percent * len(values) // 100)) - 1, 0)]
+
+
+class LoadMetrics:
+    """
+    Collects the metrics of loading ANNOVAR files: the time spent parsing
+    and in the database, the statements, rows and seconds per table and
+    the latency of every batch. The worker threads of the parallel loader
+    add their metrics at the same time, so adding is done under a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.commit_seconds = 0.0
+        self.commits = 0
+        self.tables = {}
+        self.batch_seconds = []
+
+    def add_statements(self, table, statements, rows, seconds):
+        """
+        Adds statements that inserted rows in a table
+
+        Args:
+            table (String): The name of the table
+            statements (Int): The number of statements executed
+            rows (Int): The number of rows inserted
+            seconds (Float): The time the statements took
+        """
+        with self.lock:
+            stats = self.tables.setdefault(table, {'statements': 0, 'rows': 0, 'seconds': 0.0})
+            stats['statements'] += statements
+            stats['rows'] += rows
+            stats['seconds'] += seconds
+
+    def add_commit(self, seconds):
+        """ Adds a commit that took `seconds` """
+        with self.lock:
+            self.commits += 1
+            self.commit_seconds += seconds
+
+    def add_batch(self, seconds):
+        """ Adds the time it took to insert (and commit) a batch """
+        with self.lock:
+            self.batch_seconds.append(seconds)
+
+    def report(self, table_rows=None, backend=None):
+        """
+        Returns the metrics as a dictionary, e.g. to write as JSON
+
+        Args:
+            table_rows (Dictionary): The number of rows of every table
+            backend (String): The name of the storage backend
+        Return:
+            report (Dictionary): The metrics, times in seconds
+        """
+        with self.lock:
+            tables = {}
+            for table, stats in self.tables.items():
+                tables[table] = dict(stats, rows_per_second=stats['rows'] /
+                                     max(stats['seconds'], 1e-9))
+            for table, rows in (table_rows or {}).items():
+                tables.setdefault(table, {'statements': 0, 'rows': 0, 'seconds': 0.0,
+                                          'rows_per_second': 0.0})['table_rows'] = rows
+
+            batch_seconds = sorted(self.batch_seconds)
+            batches = {'count': len(batch_seconds),
+                       'mean': sum(batch_seconds) / len(batch_seconds) if batch_seconds else 0,
+                       'max': batch_seconds[-1] if batch_seconds else 0}
+            for percent in PERCENTILES:
+                batches['p{}'.format(percent)] = percentile(batch_seconds, percent)
+
+            return {'backend': backend,
+                    'load_seconds': self.load_seconds,
+                    'parse_seconds': self.parse_seconds,
+                    'database_seconds': sum(stats['seconds'] for stats in self.tables.values()) +
+                                        self.commit_seconds,
+                    'commit_seconds': self.commit_seconds,
+                    'commits': self.commits,
+                    'statements': sum(stats['statements'] for stats in self.tables.values()),
+                    'tables': tables,
+                    'batches': batches}
+
+    @staticmethod
+    def summary(report):
+        """
+        Returns a report as lines of text
+
+        Args:
+            report (Dictionary): The metrics, as returned by `report`
+        Return:
+            lines (List): The lines of the summary
+        """
+        lines = ["Loaded in {:.2f} s: parsing {:.2f} s, database {:.2f} s (of which {} commits "
+                 "{:.2f} s), {} statements".format(report['load_seconds'],
+                                                   report['parse_seconds'],
+                                                   report['database_seconds'], report['commits'],
+                                                   report['commit_seconds'],
+                                                   report['statements'])]
+        for table, stats in report['tables'].items():
+            lines.append("  {}: {} rows inserted with {} statements in {:.2f} s "
+                         "({:.0f} rows/s)".format(table, stats['rows'], stats['statements'],
+                                                  stats['seconds'], stats['rows_per_second']))
+
+        batches = report['batches']
+        if batches['count']:
+            lines.append("  batch latency of {} batches: {}, mean {:.1f} ms, max {:.1f} ms".format(
+                batches['count'],
+                ", ".join("p{} {:.1f} ms".format(percent, batches['p{}'.format(percent)] * 1000)
+                          for percent in PERCENTILES),
+                batches['mean'] * 1000, batches['max'] * 1000))
+        return lines
+
+
 class AnnovarDatabaseFiller:
     """
-    With this object you can write your annovar file to a database
+    With this object you can write your annovar file to a database. The
+    database is a MySQL server, or another storage backend (`SQLiteBackend`)
     """
 
-    def __init__(self, user, password, host, database):
+    def __init__(self, user=None, password=None, host=None, database=None,
+                 batch_size=BATCH_SIZE, allow_local_infile=False, backend=None):
         self.dbcon = None
         self.cursor = None
+        self.batch_size = batch_size
+        # A prepared cursor per insert statement
+        self.prepared = {}
+        self.metrics = LoadMetrics()
 
-        self.connect_to_database(user, password, host, database)
+        if backend is None:
+            backend = MySQLBackend(user, password, host, database, allow_local_infile)
+        self.backend = backend
+        self.connect_to_database()
 
         self.tables = ["chromosomes", "genes", "variants"]
         self.columns = {}
+        self.id_columns = {}
         for table in self.tables:
-            self.cursor.execute("desc %s" % table)
+            tdescription = self.backend.describe(self.cursor, table)
+            # Get the actual columns from the table, the first is the id
+            self.id_columns[table] = tdescription[0]
+            self.columns[table] = tdescription[1:]
 
-            tdescription = self.cursor.fetchall()
-            # Get the actual columns from the table
-            self.columns[table] = [column[0] for column in tdescription][1:]
+        # The ids of the chromosomes and genes in the database
+        self.chrom_ids = {}
+        self.gene_ids = {}
+        self.load_ids()
 
-    def connect_to_database(self, user, password, host, database):
+    def connect_to_database(self):
         """
-        Connect to the mysql database using the given credentials
+        Connect to the database of the storage backend
 
-        Args:
-            user (String): The username for the database
-            password (String): The Password of the user for the database
-            host (String): The host adres of de database
-            database (string): The name of the database
         Return:
-            dbcon (Connection): A connection to the given database
+            None
         """
         try:
-            self.dbcon = mysql.connector.connect(user=user,
-                                                 password=password,
-                                                 host=host,
-                                                 database=database)
+            self.dbcon = self.backend.connect()
 
             self.cursor = self.dbcon.cursor()
 
@@ -117,113 +462,286 @@ class AnnovarDatabaseFiller:
             None
         """
         with open(sql_file) as sql_data:
-            data = sql_data.read()
-            commands = data.strip().split(";")
-
-            # Execute every command from the input file
-            for command in commands:
-                self.cursor.execute(command)
+            self.backend.execute_script(self.dbcon, self.cursor, sql_data.read())
 
-        self.dbcon.commit()
+        self.close_prepared()
+        self.load_ids()
         print("Tables are reset")
 
-    def parse_annovar(self, file):
+    def load_ids(self):
+        """
+        Reads the ids of all chromosomes and genes in the database, so they
+        do not have to be looked up for every row. Names are compared case
+        insensitive (with `key`), like the database does.
+
+        Return:
+            None
         """
-        Parse the ANNOVAR file
+        self.chrom_ids.clear()
+        self.gene_ids.clear()
+        for table, ids in zip(self.tables, (self.chrom_ids, self.gene_ids)):
+            # The name column is the last column of both tables
+            self.cursor.execute("SELECT {0}, {1} FROM {2}".format(self.id_columns[table],
+                                                                  self.columns[table][-1],
+                                                                  table))
+            for row_id, name in self.cursor.fetchall():
+                ids.setdefault(self.key(name), row_id)
+
+    @staticmethod
+    def key(name):
+        """ Returns the key of a chromosome or gene name in the id dictionaries """
+        return name.casefold()
+
+    def parse_annovar(self, file, cache_dir=None):
+        """
+        Parse the ANNOVAR file, the rows are inserted in batches of
+        `batch_size` rows
 
         Args:
-            file (String): The path to the ANNOVAR file
+            file (String): The path to the ANNOVAR file, the file may be gzip or
+                           BGZF compressed
+            cache_dir (String): If given, the parsed file is stored in and read
+                                from this cache directory
 
         Return:
             None
         """
-        header = []
+        start_time = time.perf_counter()
+        for batch in self.read_batches(file, cache_dir):
+            self.insert_batch(batch)
+        self.metrics.load_seconds += time.perf_counter() - start_time
 
-        # Open file
-        with open(file) as data:
+    def read_batches(self, file, cache_dir=None):
+        """
+        Reads the ANNOVAR file in batches of `batch_size` rows, the time
+        spent reading is added to the parse time of the metrics
 
-            # Read file contents
-            for i, variant in enumerate(data):
+        Args:
+            file (String): The path to the ANNOVAR file
+            cache_dir (String): If given, the parsed file is stored in and read
+                                from this cache directory
 
-                # Get header if we're processing the first line
-                if i == 0:
-                    header = self.process_annovar_line(variant, header=False)
-                    continue
+        Return:
+            (Generator): The batches, lists with rows (dictionaries)
+        """
+        batch = []
+        start_time = time.perf_counter()
+        for row in self.read_annovar(file, cache_dir):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.metrics.parse_seconds += time.perf_counter() - start_time
+                yield batch
+                batch = []
+                start_time = time.perf_counter()
+
+        self.metrics.parse_seconds += time.perf_counter() - start_time
+        if batch:
+            yield batch
+
+    def parse_annovar_parallel(self, file, workers, cache_dir=None, queue_size=QUEUE_SIZE):
+        """
+        Parse the ANNOVAR file with a pipeline: this thread reads the batches
+        and inserts (and commits) their new chromosomes and genes, so all ids
+        are known. The variants of the batches are put on a queue and inserted
+        by `workers` threads, each with its own connection (from a pool).
+        Variants of different batches may be inserted in a different order
+        than in the file.
 
-                # Process the data and add to a list
-                row = self.process_annovar_line(variant, header)
+        Args:
+            file (String): The path to the ANNOVAR file
+            workers (Int): The number of insert threads
+            cache_dir (String): If given, the parsed file is stored in and read
+                                from this cache directory
+            queue_size (Int): The maximum number of batches waiting in the queue
+
+        Return:
+            load_stats (Dictionary): The number of 'rows' and 'batches', the
+                                     'seconds' it took and the 'max' and 'mean'
+                                     queue depth
+        """
+        batches = queue.Queue(maxsize=queue_size)
+        errors = []
+        depths = []
+        rows = 0
+        start_time = time.perf_counter()
 
-                # Insert the data in the database
-                self.insert_chromosomes(row)
+        threads = [threading.Thread(target=self.insert_worker, args=(dbcon, batches, errors))
+                   for dbcon in self.backend.connections(workers)]
+        for thread in threads:
+            thread.start()
 
-                self.insert_genes(row)
+        try:
+            for batch in self.read_batches(file, cache_dir):
+                if errors:
+                    break
+                self.insert_chromosomes(batch)
+                self.insert_genes(batch)
+                self.commit()
+
+                depths.append(batches.qsize())
+                batches.put(batch)
+                rows += len(batch)
+        finally:
+            # Stop the workers once the queue is empty
+            for _ in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+        seconds = time.perf_counter() - start_time
+        self.metrics.load_seconds += seconds
+        load_stats = {'rows': rows, 'batches': len(depths), 'seconds': seconds,
+                      'max': max(depths, default=0),
+                      'mean': sum(depths) / len(depths) if depths else 0}
+        print("Inserted {} variants with {} workers in {:.2f} s ({:.0f} rows/s), queue depth "
+              "max {} mean {:.1f} of {}".format(rows, workers, seconds,
+                                                rows / max(seconds, 1e-9), load_stats['max'],
+                                                load_stats['mean'], queue_size))
+        return load_stats
+
+    def insert_worker(self, dbcon, batches, errors):
+        """
+        Inserts the variants of the batches on the queue until it gets None,
+        every batch is committed. Used by `parse_annovar_parallel`.
 
-                self.insert_variants(row)
+        Args:
+            dbcon (Connection): The connection of this worker
+            batches (Queue): The queue with batches of rows
+            errors (List): Exceptions are added to this list
 
-    @staticmethod
-    def process_annovar_line(variant, header):
+        Return:
+            None
+        """
+        prepared = {}
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                # After an error the remaining batches are skipped
+                if errors:
+                    continue
+                try:
+                    start_time = time.perf_counter()
+                    self.insert_variants(batch, dbcon, prepared)
+                    self.commit(dbcon)
+                    self.metrics.add_batch(time.perf_counter() - start_time)
+                except Exception as error:
+                    # Keep taking batches from the queue, so the reader does not block
+                    errors.append(error)
+        finally:
+            for cursor in prepared.values():
+                cursor.close()
+            # Return the connection to the pool (if any)
+            dbcon.close()
+
+    def insert_batch(self, rows):
         """
-        Given a list of column indices, parse the header and all data lines
+        Inserts a batch of rows in the database and commits them
 
         Args:
-            variant (String): A single row of a annovar file
-            header (List): A list of the headers in a annovar file
+            rows (List): The rows (dictionaries) of the annovar file
 
         Return:
-            (Dictionary): A Dictionary with the the correct values to each header.
+            None
         """
-        # Define the columns of interest
-        columns = [*range(0, 4), *range(9, 11), *range(15, 17), 27, *range(30, 36), 53]
+        start_time = time.perf_counter()
 
-        data = variant.split("\t")
+        # Insert the data in the database
+        self.insert_chromosomes(rows)
 
-        # Extract values for selected columns
-        annotation_values = itemgetter(*columns)(data)
+        self.insert_genes(rows)
 
-        # Return list of values if header is requested
-        if not header:
-            return [annotation.lower() for annotation in annotation_values]
+        self.insert_variants(rows)
 
-        # Return all data as a dictionary with column: value
-        return dict(
-                    zip(
-                        [field.strip() for field in header],
-                        [field.strip() for field in annotation_values]
-                    )
-        )
+        self.commit()
+        self.metrics.add_batch(time.perf_counter() - start_time)
 
-    def insert_chromosomes(self, row):
+    def commit(self, dbcon=None):
         """
-        Get Chromosome information: chromosome
+        Commits the transaction of a connection, the time it takes is added
+        to the metrics
 
         Args:
-            row (Dictionary): a row of the annovar file
+            dbcon (Connection): The connection to commit, by default the own connection
 
         Return:
             None
         """
-        columns = self.columns[self.tables[0]]
-        # The items that need to go in the db
-        items = self.get_item(row, columns)
+        if dbcon is None:
+            dbcon = self.dbcon
 
-        # Check if chrom is in the table
-        chrom_in_db_query = "SELECT * FROM {0} WHERE {1} = {2}".format(self.tables[0],
-                                                                       columns[0],
-                                                                       items[columns[0]][0])
+        start_time = time.perf_counter()
+        dbcon.commit()
+        self.metrics.add_commit(time.perf_counter() - start_time)
 
-        # Execute the query
-        self.cursor.execute(chrom_in_db_query)
-        # if the length of the query is more than nothing
-        if not self.cursor.fetchall():
-            # insert Chromosome information into the Chromosome table
-            self.insert_row(self.tables[0], items)
+    @staticmethod
+    def read_annovar(file, cache_dir=None):
+        """
+        Reads the columns of interest from the ANNOVAR file, with the refseq_gene
+        values replaced by the filtered gene names
 
-    def insert_genes(self, row):
+        Args:
+            file (String): The path to the ANNOVAR file
+            cache_dir (String): If given, the parsed file is stored in and read
+                                from this cache directory, see `annovar_cache`
+
+        Return:
+            (AnnovarTable): The table, iterating over it gives a dictionary per
+                            row with the lowercase header names as keys
+        """
+        def parse():
+            table = deliverable6.parse_annovar(file, COLUMNS)
+            names = [name.lower() for name in table.names]
+            columns = table.columns
+            for column_nr, name in enumerate(names):
+                if name == 'refseq_gene':
+                    columns[column_nr] = gene_names.get_gene_names(columns[column_nr])
+            return names, columns
+
+        if cache_dir is None:
+            return deliverable6.AnnovarTable(*parse())
+        return deliverable6.AnnovarTable(*annovar_cache.load_columns(
+            file, 'deliverable9:{!r}'.format(COLUMNS), parse, cache_dir))
+
+    def insert_chromosomes(self, rows):
         """
-        Get gene_information (Script 7): chrom_id, refseq_gene
+        Get Chromosome information: chromosome. Only chromosomes that are not
+        in the database yet are inserted.
 
         Args:
-            row (Dictionary): a row of the annovar file
+            rows (List): The rows of the annovar file
+
+        Return:
+            None
+        """
+        columns = self.columns[self.tables[0]]
+        insert = "INSERT INTO {0}({1}) VALUES(%s)".format(self.tables[0], columns[0])
+        inserted = 0
+        start_time = time.perf_counter()
+
+        for row in rows:
+            chromosome = row[columns[0]]
+            key = self.key(chromosome)
+            if key not in self.chrom_ids:
+                # insert Chromosome information into the Chromosome table
+                cursor = self.execute_prepared(insert, (chromosome,))
+                self.chrom_ids[key] = cursor.lastrowid
+                inserted += 1
+
+        self.metrics.add_statements(self.tables[0], inserted, inserted,
+                                    time.perf_counter() - start_time)
+
+    def insert_genes(self, rows):
+        """
+        Get gene_information (Script 7): chrom_id, refseq_gene. Only genes that
+        are not in the database yet are inserted.
+
+        Args:
+            rows (List): The rows of the annovar file
 
         Return:
             None
@@ -233,117 +751,258 @@ class AnnovarDatabaseFiller:
 
         # Get the gene columns
         gene_columns = self.columns[self.tables[1]]
-
-        # Get Chrom_id
-        chrom = "'{}'".format(row[chrom_columns[0]])
-        row[gene_columns[0]] = "(SELECT {0} FROM {1} WHERE {2} = {3})".format(gene_columns[0],
-                                                                              self.tables[0],
-                                                                              chrom_columns[0],
-                                                                              chrom)
-
-        # Get refseq_gene
-        row[gene_columns[1]] = self.get_gene_name(row[gene_columns[1]])
-
-        # Get the items that need to be put in the database
-        items = self.get_item(row, gene_columns)
-
-        # Check if gene is in the table
-        gene_in_db_query = "SELECT * FROM {0} WHERE {1} = {2}".format(self.tables[1],
-                                                                      gene_columns[1],
-                                                                      items[gene_columns[1]][0])
-        self.cursor.execute(gene_in_db_query)
-
-        # Check if the query returns empty
-        if not self.cursor.fetchall():
-            # insert Gene information into the Gene table
-            self.insert_row(self.tables[1], items)
-
-    def insert_variants(self, row):
+        insert = "INSERT INTO {0}({1}, {2}) VALUES(%s, %s)".format(self.tables[1],
+                                                                   gene_columns[0],
+                                                                   gene_columns[1])
+        inserted = 0
+        start_time = time.perf_counter()
+
+        for row in rows:
+            gene = row[gene_columns[1]]
+            key = self.key(gene)
+            if key not in self.gene_ids:
+                # Get Chrom_id, insert Gene information into the Gene table
+                chrom_id = self.chrom_ids[self.key(row[chrom_columns[0]])]
+                cursor = self.execute_prepared(insert, (chrom_id, gene))
+                self.gene_ids[key] = cursor.lastrowid
+                inserted += 1
+
+        self.metrics.add_statements(self.tables[1], inserted, inserted,
+                                    time.perf_counter() - start_time)
+
+    def insert_variants(self, rows, dbcon=None, prepared=None):
         """
         get variant information: gene_id, refseq_func, dbsnp138, EUR, LJB2_SIFT,
         LJB2_PolyPhen2_HDIV, clinvar, begin position and reference.
 
         Args:
-            row (Dictionary): a row of the annovar file
+            rows (List): The rows of the annovar file
+            dbcon (Connection): The connection to use, by default the own connection
+            prepared (Dictionary): The prepared cursors of `dbcon`
 
         Return:
             None
         """
         gene_columns = self.columns[self.tables[1]]
         variant_columns = self.columns[self.tables[2]]
+        row_values = "({})".format(", ".join(["%s"] * len(variant_columns)))
+        start_time = time.perf_counter()
+
+        if not self.backend.multi_row_insert:
+            # A single-row insert, executed for all rows at once
+            insert = "INSERT INTO {0}({1}) VALUES {2}".format(self.tables[2],
+                                                              column_list(variant_columns),
+                                                              row_values)
+            values = [(self.gene_ids[self.key(row[gene_columns[1]])],) +
+                      self.get_values(row, variant_columns[1:]) for row in rows]
+            self.execute_prepared(insert, values, dbcon, prepared, many=True)
+            self.metrics.add_statements(self.tables[2], 1, len(rows),
+                                        time.perf_counter() - start_time)
+            return
+
+        # A single multi-row insert for (at most MAX_PARAMETERS values of) the rows
+        rows_per_insert = MAX_PARAMETERS // len(variant_columns)
+        for start in range(0, len(rows), rows_per_insert):
+            insert_rows = rows[start:start + rows_per_insert]
+            insert = "INSERT INTO {0}({1}) VALUES {2}".format(self.tables[2],
+                                                              column_list(variant_columns),
+                                                              ", ".join([row_values] *
+                                                                        len(insert_rows)))
+
+            # Get gene_id, insert variant information into Variant table
+            values = []
+            for row in insert_rows:
+                values.append(self.gene_ids[self.key(row[gene_columns[1]])])
+                values.extend(self.get_values(row, variant_columns[1:]))
+            self.execute_prepared(insert, values, dbcon, prepared)
+
+        self.metrics.add_statements(self.tables[2], -(-len(rows) // rows_per_insert), len(rows),
+                                    time.perf_counter() - start_time)
+
+    def execute_prepared(self, statement, values, dbcon=None, prepared=None, many=False):
+        """
+        Executes a statement as prepared statement with the given values as
+        parameters. Every statement gets its own prepared cursor, so it is
+        only prepared once.
 
-        # Get gene_id
-        ref_gene = "'{}'".format(self.get_gene_name(row[gene_columns[1]]))
-        gene_id = "(SELECT {0} FROM {1} WHERE {2} = {3})".format(variant_columns[0],
-                                                                 self.tables[1],
-                                                                 gene_columns[1],
-                                                                 ref_gene)
-        row[variant_columns[0]] = gene_id
+        Args:
+            statement (String): The SQL statement with %s parameters
+            values (Sequence): The values of the parameters, or with `many`
+                               a sequence of them
+            dbcon (Connection): The connection to use, by default the own connection
+            prepared (Dictionary): The prepared cursors of `dbcon`
+            many (Bool): Execute the statement for every sequence of values
 
-        items = self.get_item(row, variant_columns)
+        Return:
+            cursor (Cursor): The prepared cursor that executed the statement
+        """
+        if dbcon is None:
+            dbcon = self.dbcon
+            prepared = self.prepared
+
+        cursor = prepared.get(statement)
+        if cursor is None:
+            cursor = self.backend.prepared_cursor(dbcon)
+            prepared[statement] = cursor
+        if many:
+            cursor.executemany(self.backend.sql(statement), values)
+        else:
+            cursor.execute(self.backend.sql(statement), values)
+        return cursor
 
-        # insert variant information into Variant table
-        self.insert_row(self.tables[2], items)
+    def close_prepared(self):
+        """
+        Closes all prepared cursors
+        """
+        for cursor in self.prepared.values():
+            cursor.close()
+        self.prepared.clear()
 
-    @staticmethod
-    def get_item(row, db_keys):
+    def bulk_load(self, file, cache_dir=None, staging_dir=None):
         """
-        Creates a dictionary where the keys are the db columns, with the correct value
+        Loads the ANNOVAR file with LOAD DATA LOCAL INFILE (for SQLite with
+        executemany) instead of INSERT statements per batch. The new
+        chromosomes, new genes and all variants are written to a tab
+        separated staging file per table, with the ids of the new chromosomes
+        and genes assigned here. The files are loaded one table at a time and
+        committed together.
 
         Args:
-            row (Dict): a row of the annovar file
-            db_keys (List): A list with the names of the db columns
+            file (String): The path to the ANNOVAR file
+            cache_dir (String): If given, the parsed file is stored in and read
+                                from this cache directory
+            staging_dir (String): The directory for the staging files, by
+                                  default the temporary directory
 
-        Returns:
-            value (Dict): A dictionary where the keys are db columns with the corresponding values.
+        Return:
+            load_stats (Dictionary): Per table the number of rows loaded and
+                                     the seconds it took
         """
-        # A container dict where the keys are db columns
-        value = {}
-
-        for key in db_keys:
-            # If current value is empty
-            if row[key] == "":
-                value[key] = ["null"]
-            # If current value is a Int/Float or if the current value is a subquery
-            elif row[key].isnumeric() or row[key].startswith("("):
-                value[key] = [row[key]]
-            # otherwise put the value in quotes
-            else:
-                value[key] = ["'{}'".format(row[key])]
-        return value
+        chrom_columns, gene_columns, variant_columns = [self.columns[table]
+                                                        for table in self.tables]
+        table_columns = [[self.id_columns[self.tables[0]]] + chrom_columns,
+                         [self.id_columns[self.tables[1]]] + gene_columns,
+                         variant_columns]
+        next_ids = [self.next_id(table) for table in self.tables[:2]]
+        rows = dict.fromkeys(self.tables, 0)
+        load_stats = {}
+        load_start_time = time.perf_counter()
 
-    def insert_row(self, table, variablen):
+        try:
+            with tempfile.TemporaryDirectory(dir=staging_dir) as temp_dir:
+                paths = [os.path.join(temp_dir, table + '.tsv') for table in self.tables]
+                files = [open(path, 'w', encoding='utf-8', newline='\n') for path in paths]
+                chrom_file, gene_file, variant_file = files
+                try:
+                    for row in self.read_annovar(file, cache_dir):
+                        # Assign an id to a new chromosome
+                        chromosome = row[chrom_columns[0]]
+                        chrom_key = self.key(chromosome)
+                        if chrom_key not in self.chrom_ids:
+                            self.chrom_ids[chrom_key] = next_ids[0]
+                            next_ids[0] += 1
+                            chrom_file.write(self.tsv_line((self.chrom_ids[chrom_key],
+                                                            chromosome)))
+                            rows[self.tables[0]] += 1
+
+                        # Assign an id to a new gene
+                        gene = row[gene_columns[1]]
+                        gene_key = self.key(gene)
+                        if gene_key not in self.gene_ids:
+                            self.gene_ids[gene_key] = next_ids[1]
+                            next_ids[1] += 1
+                            gene_file.write(self.tsv_line((self.gene_ids[gene_key],
+                                                           self.chrom_ids[chrom_key], gene)))
+                            rows[self.tables[1]] += 1
+
+                        variant_file.write(self.tsv_line(
+                            (self.gene_ids[gene_key],) + self.get_values(row,
+                                                                         variant_columns[1:])))
+                        rows[self.tables[2]] += 1
+                finally:
+                    for staging_file in files:
+                        staging_file.close()
+                # Writing the staging files is the parse time of a bulk load
+                self.metrics.parse_seconds += time.perf_counter() - load_start_time
+
+                for table, columns, path in zip(self.tables, table_columns, paths):
+                    start_time = time.perf_counter()
+                    self.backend.load_file(self.cursor, table, columns, path)
+                    load_stats[table] = {'rows': rows[table],
+                                         'seconds': time.perf_counter() - start_time}
+                self.commit()
+        except BaseException:
+            # The ids assigned to new chromosomes and genes are not in the
+            # database, whatever went wrong
+            try:
+                self.dbcon.rollback()
+            finally:
+                self.load_ids()
+            raise
+
+        self.metrics.load_seconds += time.perf_counter() - load_start_time
+        for table, stats in load_stats.items():
+            self.metrics.add_statements(table, 1, stats['rows'], stats['seconds'])
+            print("Loaded {} rows into {} in {:.2f} s ({:.0f} rows/s)".format(
+                stats['rows'], table, stats['seconds'],
+                stats['rows'] / max(stats['seconds'], 1e-9)))
+        return load_stats
+
+    def next_id(self, table):
         """
-        Inserts a row into a given table in the given database
+        Returns the id after the highest id in a table
 
         Args:
-            table (String): Name of the table you want to insert a row into
-            variablen (Dictionary): Contains the data you want to put in the table, the keys should
-                                    match the columns in the table.
+            table (String): Name of the table
 
         Return:
-            None
+            (Int): The next free id
         """
-        # Get the keys
-        keys = list(variablen.keys())
+        self.cursor.execute("SELECT MAX({0}) FROM {1}".format(self.id_columns[table], table))
+        return (self.cursor.fetchall()[0][0] or 0) + 1
 
-        # Go tru all variables
-        for index in enumerate(variablen[keys[0]]):
+    @staticmethod
+    def tsv_line(values):
+        """
+        Formats values as a line of a LOAD DATA staging file, None becomes \\N
+        and tabs, newlines and backslashes are escaped
 
-            # Create the list where all variables wil be collected in
-            var_lijst = []
+        Args:
+            values (Tuple): The values of a row
 
-            # Get all variables
-            for key in keys:
-                var_lijst.append("{}".format(variablen[key][index[0]]))
+        Returns:
+            (String): The tab separated line
+        """
+        return "\t".join(TSV_NULL if value is None else str(value).translate(TSV_ESCAPES)
+                         for value in values) + "\n"
 
-            # Create the SQL Insert statement
-            insert = "INSERT INTO {}({}) VALUES({}) ".format(table,
-                                                             ", ".join(keys),
-                                                             ", ".join(var_lijst))
+    @staticmethod
+    def get_values(row, db_keys):
+        """
+        Returns the values of the given db columns from a row, converted to
+        the type of the column (see `COLUMN_TYPES`). Empty values become None
+        (NULL), just as missing ('.') or invalid values of numeric columns.
 
-            # Execute the insert statement
-            self.cursor.execute(insert)
+        Args:
+            row (Dict): a row of the annovar file
+            db_keys (List): A list with the names of the db columns
+
+        Returns:
+            values (Tuple): The values in the order of the db columns
+        """
+        values = []
+        for key in db_keys:
+            value = row[key]
+            column_type = COLUMN_TYPES.get(key)
+            if value == "":
+                value = None
+            elif column_type is not None:
+                try:
+                    value = column_type(value) if value not in MISSING_VALUES else None
+                except ValueError:
+                    value = None
+            values.append(value)
+        return tuple(values)
 
     @staticmethod
     def get_gene_name(gene_name):
@@ -356,33 +1015,48 @@ class AnnovarDatabaseFiller:
         Returns:
             gene (String): The filtered gene name
         """
-        # Regular Expression Link to explenation: https://regex101.com/r/UPDa0e/5
-        reg_ex = r"((?=LOC)[A-Z0-9\-]+|(?=LIN)[A-Z0-9\-]+|NONE|\([^)]*\))?(?(1)|([A-Z0-9\-]+))"
+        return gene_names.get_gene_name(gene_name)
 
-        # Finding all matches with the regular expression
-        match_tuple = re.finditer(reg_ex, gene_name, re.IGNORECASE)
+    def table_sizes(self):
+        """
+        Counts the rows in the tables used in this script
 
-        # Setting the values of group 2 in a list if the values are not empty string
-        match = [match.group(2) for match in match_tuple
-                 if match.group(2) != "" and match.group(2) is not None]
+        Return:
+            sizes (Dictionary): The number of rows of every table
+        """
+        sizes = {}
+        for table in self.tables:
+            self.cursor.execute("SELECT COUNT(*) FROM {}".format(table))
+            sizes[table] = self.cursor.fetchall()[0][0]
+        return sizes
 
-        if match:
-            gene = "/".join(match)
-        else:
-            gene = "-"
-        return gene
+    def metrics_report(self):
+        """
+        Returns the metrics of the loads with this object and the current
+        number of rows of the tables, see `LoadMetrics.report`
 
-    def print_database_status(self):
+        Return:
+            report (Dictionary): The metrics
         """
-        Prints the number of rows in the tables used in this script
+        return self.metrics.report(self.table_sizes(), self.backend.name)
+
+    def print_database_status(self, report=None):
         """
+        Prints the number of rows in the tables used in this script, and a
+        summary of the metrics if anything was loaded
+
+        Args:
+            report (Dictionary): The metrics, by default `metrics_report`
+        """
+        if report is None:
+            report = self.metrics_report()
 
-        # Get nuber of row for each table
         for table in self.tables:
-            query = "SELECT * FROM {}".format(table)
-            self.cursor.execute(query)
-            rows = len(self.cursor.fetchall())
-            print("The table {} contains {} rows".format(table, rows))
+            print("The table {} contains {} rows".format(table,
+                                                        report['tables'][table]['table_rows']))
+        if report['statements']:
+            for line in LoadMetrics.summary(report):
+                print(line)
 
     def close_conection_to_database(self):
         """
@@ -391,7 +1065,8 @@ class AnnovarDatabaseFiller:
         # Commit all db changes
         self.dbcon.commit()
 
-        # Close the cursor
+        # Close the cursors
+        self.close_prepared()
         self.cursor.close()
 
         # Close the db connection
@@ -406,30 +1081,79 @@ def main():
     parser = argparse.ArgumentParser(description='Read a ANNOVAR file and puts the columns needed \
     for the experiment in a database.')
 
-    parser.add_argument('user', type=str, help='Name of database user')
+    parser.add_argument('user', type=str, nargs='?', help='Name of database user')
 
-    parser.add_argument('password', type=str, help='user password for database')
+    parser.add_argument('password', type=str, nargs='?', help='user password for database')
 
-    parser.add_argument('host', type=str, help='database host')
+    parser.add_argument('host', type=str, nargs='?', help='database host')
 
-    parser.add_argument('database', type=str, help='Name of database')
+    parser.add_argument('database', type=str, nargs='?', help='Name of database')
 
     parser.add_argument('file', type=str, help='ANNOVAR annotation file')
 
     parser.add_argument("-s", "--sql_file", type=str, help='if given this file will be executed. \
                         This should only contain the data to reset the tables used in this script.')
 
-    args = parser.parse_args()
+    parser.add_argument("--sqlite", type=str, metavar='DATABASE_FILE',
+                        help='use this SQLite database file instead of a MySQL database, a new \
+                        file gets the tables of {}'.format(os.path.basename(SQLITE_SCHEMA)))
+
+    parser.add_argument("-c", "--cache_dir", type=str,
+                        help='cache the parsed ANNOVAR file in this directory, by default \
+                        the file is parsed on every run')
+
+    parser.add_argument("--bulk_load", "--bulk-load", action='store_true',
+                        help='load the data with LOAD DATA LOCAL INFILE, this has to be \
+                        enabled on the server (local_infile). With --sqlite the staging files \
+                        are inserted with executemany')
+
+    parser.add_argument("-w", "--workers", type=int, default=0,
+                        help='number of threads (each with an own connection) inserting the \
+                        variants, by default the variants are inserted by the main thread')
 
-    connection = AnnovarDatabaseFiller(args.user, args.password, args.host, args.database)
+    parser.add_argument("-q", "--queue_size", type=int, default=QUEUE_SIZE,
+                        help='maximum number of batches waiting for the workers (default: {})'
+                        .format(QUEUE_SIZE))
+
+    parser.add_argument("-b", "--batch_size", type=int, default=BATCH_SIZE,
+                        help='number of rows inserted and committed at once (default: {})'
+                        .format(BATCH_SIZE))
+
+    parser.add_argument("-m", "--metrics", type=str, metavar='JSON_FILE',
+                        help='write the metrics of the load (table sizes, parse and database \
+                        time, statements, rows/s per table, batch latency) to this JSON file')
+
+    # Options may also be given between the (optional) database arguments and the file
+    args = parser.parse_intermixed_args()
+
+    if args.sqlite is not None:
+        connection = AnnovarDatabaseFiller(batch_size=args.batch_size,
+                                           backend=SQLiteBackend(args.sqlite))
+    elif None in (args.user, args.password, args.host, args.database):
+        parser.error('username, password, hostname and database_name are required without '
+                     '--sqlite')
+    else:
+        connection = AnnovarDatabaseFiller(args.user, args.password, args.host, args.database,
+                                           args.batch_size, allow_local_infile=args.bulk_load)
 
     if args.sql_file is not None and check_file_exists(args.sql_file):
         connection.reset_tables(args.sql_file)
 
     if check_file_exists(args.file) and check_file_tab_separated(args.file):
-        connection.parse_annovar(args.file)
+        cache_dir = args.cache_dir
+        if args.bulk_load:
+            connection.bulk_load(args.file, cache_dir)
+        elif args.workers > 0:
+            connection.parse_annovar_parallel(args.file, args.workers, cache_dir,
+                                              args.queue_size)
+        else:
+            connection.parse_annovar(args.file, cache_dir)
 
-    connection.print_database_status()
+    report = connection.metrics_report()
+    connection.print_database_status(report)
+    if args.metrics is not None:
+        with open(args.metrics, 'w') as metrics_file:
+            json.dump(report, metrics_file, indent=4)
 
     connection.close_conection_to_database()
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+BFV2 Theme 05 - Genomics - Sequencing Project
+
+Filtering of gene names from the 'RefSeq_Gene' column of ANNOVAR output
+files, shared by deliverable 7 and 9.
+
+Gene names repeat a lot in an ANNOVAR file, so the filtered names are
+kept in a bounded cache. A single gene symbol (the most common value) is
+returned as it is, without the regular expression.
+
+    usage:
+        python3 gene_names.py refseq_gene [refseq_gene ...]
+"""
+
+# METADATA VARIABLES
+__author__ = "Micha Beens, Nadia Choudhury"
+__status__ = "Finished"
+__version__ = "2019.gn.v1"
+
+# IMPORT
+import sys
+import re
+from functools import lru_cache
+
+# Regular Expression Link to explenation: https://regex101.com/r/UPDa0e/5
+GENE_PATTERN = re.compile(
+    r"((?=LOC)[A-Z0-9\-]+|(?=LIN)[A-Z0-9\-]+|NONE|\([^)]*\))?(?(1)|([A-Z0-9\-]+))",
+    re.IGNORECASE)
+# A single (ASCII) gene symbol, it is its own filtered name unless it starts
+# with one of the skipped prefixes
+PLAIN_GENE = re.compile(r"[A-Za-z0-9\-]+")
+SKIPPED_PREFIXES = ('LOC', 'LIN', 'NONE')
+
+# Maximum number of filtered gene names kept in the cache
+GENE_CACHE_SIZE = 65536
+
+
+# FUNCTIONS
+@lru_cache(maxsize=GENE_CACHE_SIZE)
+def get_gene_name(gene_name):
+    """
+    This function returns the a filtered gene name from the given raw gene_name
+
+    Args:
+        gene_name (String): The raw gene name
+    Returns:
+        gene (String): The filtered gene name
+    """
+    # Fast path for a single gene symbol
+    if PLAIN_GENE.fullmatch(gene_name) and \
+            not gene_name[:4].upper().startswith(SKIPPED_PREFIXES):
+        return gene_name
+
+    # Setting the values of group 2 in a list if the values are not empty string
+    match = [match.group(2)
+             for match in GENE_PATTERN.finditer(gene_name)
+             if match.group(2)]
+
+    if match:
+        gene = "/".join(match)
+    else:
+        gene = "-"
+    return gene
+
+
+def get_gene_names(raw_genes):
+    """
+    Returns the filtered gene names of a column of raw RefSeq_Gene values,
+    every distinct value is filtered only once
+
+    Args:
+        raw_genes (Iterable): The raw gene names
+    Returns:
+        (List): The filtered gene names, in the same order
+    """
+    raw_genes = list(raw_genes)
+    genes = {raw_gene: get_gene_name(raw_gene) for raw_gene in set(raw_genes)}
+    return [genes[raw_gene] for raw_gene in raw_genes]
+
+
+# MAIN
+def main(args):
+    """ Main function that prints the filtered name of all given genes """
+    if len(args) < 2:
+        print(__doc__)
+        return 1
+
+    for raw_gene, gene in zip(args[1:], get_gene_names(args[1:])):
+        print(raw_gene, gene, sep='\t')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+"""
+BFV2 Theme 05 - Genomics - Sequencing Project
+
+Positional index for coordinate-sorted, tab-separated files with the
+chromosome in the first and the position in the second column (such as
+pileup and VCF files).
+
+The index maps every chromosome and position bin to the byte offset of
+the first line in that bin. It is stored next to the data file (with the
+extension '.pidx') so it only has to be built once. Within a bin the
+first line of a region is found with a binary search on the data file,
+so only the lines within a region have to be read.
+
+    usage:
+        python3 position_index.py data_file [data_file ...]
+"""
+
+# METADATA VARIABLES
+__author__ = "Micha Beens, Nadia Choudhury"
+__status__ = "Finished"
+__version__ = "2019.pi.v1"
+
+# IMPORT
+import sys
+import os
+from bisect import bisect_right
+
+INDEX_EXTENSION = '.pidx'
+BIN_SIZE = 16384
+# Below this number of bytes a region is read instead of searched
+SEARCH_SIZE = 32768
+
+
+# FUNCTIONS
+def index_filename(filename):
+    """
+    Returns the filename of the index that belongs to the given data file
+
+    Args:
+        filename (String): The filename of the data file
+    Return:
+        (String): The filename of the index
+    """
+    return filename + INDEX_EXTENSION
+
+
+def build_index(filename, bin_size=BIN_SIZE):
+    """
+    Reads the data file once and writes its positional index next to it.
+    Lines starting with '#' (headers) are skipped.
+
+    Args:
+        filename (String): The filename of the data file
+        bin_size (Int): The number of positions per bin
+    Return:
+        index (Dictionary): The index, as returned by `load_index`
+    Raises:
+        ValueError: If the data file is not sorted by chromosome and position
+    """
+    # For each chromosome (in file order) a list with (bin, offset) tuples
+    bins = {}
+    last_pos = 0
+    chrom_bins = None
+    offset = 0
+
+    with open(filename, 'rb') as file_data:
+        for line in file_data:
+            line_offset = offset
+            offset += len(line)
+            if line.startswith(b'#') or not line.strip():
+                continue
+
+            fields = line.split(b'\t', 2)
+            chrom = fields[0].decode()
+            pos = int(fields[1])
+
+            # A new chromosome has to be one that was not seen before
+            if chrom_bins is None or chrom != chrom_bins[0]:
+                if chrom in bins:
+                    raise ValueError("{} is not sorted: chromosome {} occurs in more than "
+                                     "one block".format(filename, chrom))
+                chrom_bins = (chrom, [])
+                bins[chrom] = chrom_bins[1]
+                last_pos = pos
+            elif pos < last_pos:
+                raise ValueError("{} is not sorted: position {} of chromosome {} comes "
+                                 "after position {}".format(filename, pos, chrom, last_pos))
+            last_pos = pos
+
+            # Store the offset of the first line of every new bin
+            pos_bin = pos // bin_size
+            if not chrom_bins[1] or chrom_bins[1][-1][0] != pos_bin:
+                chrom_bins[1].append((pos_bin, line_offset))
+
+    stat = os.stat(filename)
+    with open(index_filename(filename), 'w') as output:
+        output.write("#source_size\t{}\n".format(stat.st_size))
+        output.write("#source_mtime\t{}\n".format(stat.st_mtime_ns))
+        output.write("#bin_size\t{}\n".format(bin_size))
+        for chrom, chrom_bin_list in bins.items():
+            for pos_bin, bin_offset in chrom_bin_list:
+                output.write("{}\t{}\t{}\n".format(chrom, pos_bin, bin_offset))
+
+    return _create_index(bins, bin_size, stat.st_size)
+
+
+def load_index(filename):
+    """
+    Reads the positional index of the given data file
+
+    Args:
+        filename (String): The filename of the data file
+    Return:
+        index (Dictionary): The index with the 'bin_size' and the 'chromosomes',
+                            a dictionary with per chromosome (in file order) a
+                            tuple with the sorted bins, their offsets and the
+                            offset of the end of the chromosome.
+                            None if there is no index or it is out of date.
+    """
+    if not os.path.exists(index_filename(filename)):
+        return None
+
+    stat = os.stat(filename)
+    settings = {}
+    bins = {}
+    with open(index_filename(filename)) as index_data:
+        for line in index_data:
+            line = line.rstrip('\n').split('\t')
+            if line[0].startswith('#'):
+                settings[line[0][1:]] = int(line[1])
+            else:
+                bins.setdefault(line[0], []).append((int(line[1]), int(line[2])))
+
+    # The data file has changed since the index was built
+    if settings.get('source_size') != stat.st_size or \
+            settings.get('source_mtime') != stat.st_mtime_ns:
+        return None
+
+    return _create_index(bins, settings['bin_size'], stat.st_size)
+
+
+def get_index(filename, bin_size=BIN_SIZE):
+    """
+    Returns the positional index of the given data file, the index is
+    (re)built if it does not exist or is out of date
+
+    Args:
+        filename (String): The filename of the data file
+        bin_size (Int): The number of positions per bin for a new index
+    Return:
+        index (Dictionary): The index, as returned by `load_index`
+    """
+    index = load_index(filename)
+    if index is None:
+        index = build_index(filename, bin_size)
+    return index
+
+
+def _create_index(bins, bin_size, size):
+    """ Converts the (bin, offset) lists per chromosome to the index dictionary """
+    chromosomes = {}
+    chrom_list = list(bins)
+    for i, chrom in enumerate(chrom_list):
+        # A chromosome ends where the next one (in file order) starts
+        if i + 1 < len(chrom_list):
+            end = bins[chrom_list[i + 1]][0][1]
+        else:
+            end = size
+        chromosomes[chrom] = ([pos_bin for pos_bin, _ in bins[chrom]],
+                              [offset for _, offset in bins[chrom]],
+                              end)
+    return {'bin_size': bin_size, 'chromosomes': chromosomes}
+
+
+def region_offset(index, file_data, chrom, start):
+    """
+    Returns the byte offset from where to read the lines of a region.
+    The bin containing `start` is looked up in the index, within that bin
+    the line is found with a binary search on the data file.
+
+    Args:
+        index (Dictionary): The index of the data file
+        file_data (File): The data file, opened in binary mode
+        chrom (String): The chromosome as written in the data file
+        start (Int): The first position of the region
+    Return:
+        offset (Int): The offset of a line at or shortly before the first
+                      line with a position of at least `start`.
+                      None if the chromosome is not in the data file.
+    """
+    if chrom not in index['chromosomes']:
+        return None
+
+    pos_bins, offsets, end = index['chromosomes'][chrom]
+    bin_nr = max(bisect_right(pos_bins, start // index['bin_size']) - 1, 0)
+    low = offsets[bin_nr]
+    high = offsets[bin_nr + 1] if bin_nr + 1 < len(offsets) else end
+
+    # Bisect the bin on line starts, `low` stays before the first wanted line
+    while high - low > SEARCH_SIZE:
+        file_data.seek((low + high) // 2)
+        file_data.readline()
+        line_start = file_data.tell()
+        line = file_data.readline()
+        if line_start >= high or not line:
+            break
+        if int(line.split(b'\t', 2)[1]) < start:
+            low = line_start
+        else:
+            high = line_start
+
+    return low
+
+
+def fetch_lines(file_data, index, chrom, start, stop, stats=None):
+    """
+    Yields the raw lines of a region by seeking directly to it
+
+    Args:
+        file_data (File): The data file, opened in binary mode
+        index (Dictionary): The index of the data file
+        chrom (String): The chromosome as written in the data file
+        start (Int): The first position of the region
+        stop (Int): The position after the last position of the region
+        stats (Dictionary): If given, the number of 'lines' and 'bytes' read
+                            are added to it
+    Return:
+        (Generator): The lines (bytes) of the region
+    """
+    offset = region_offset(index, file_data, chrom, start)
+    if offset is None:
+        return
+
+    raw_chrom = chrom.encode()
+    file_data.seek(offset)
+    for line in file_data:
+        if stats is not None:
+            stats['lines'] = stats.get('lines', 0) + 1
+            stats['bytes'] = stats.get('bytes', 0) + len(line)
+
+        fields = line.split(b'\t', 2)
+        if fields[0] != raw_chrom:
+            break
+        pos = int(fields[1])
+        if pos >= stop:
+            break
+        if pos >= start:
+            yield line
+
+
+# MAIN
+def main(args):
+    """ Main function that builds the index of all given files """
+    if len(args) < 2:
+        print(__doc__)
+        return 1
+
+    for filename in args[1:]:
+        print('Building index of', filename)
+        index = build_index(filename)
+        print('\t> Index of', len(index['chromosomes']), 'chromosomes written to',
+              index_filename(filename))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,63 @@
+import deliverable4
+
+
+def write_data(tmp_path):
+    """ Writes a BED file with two genes and a pileup file in which the
+    positions of the first gene occur twice, the second time with another
+    coverage """
+    bed_file = tmp_path / 'genes.bed'
+    bed_file.write_text('1\t100\t150\tA\n'
+                        '1\t200\t260\tA\n'
+                        '1\t300\t340\tB\n')
+
+    lines = ['chr1\t{}\tA\t{}\t,,,\tIII\n'.format(pos, pos % 70) for pos in range(90, 350)]
+    lines += ['chr1\t{}\tA\t{}\t,,,\tIII\n'.format(pos, pos % 70 + 40) for pos in range(90, 270)]
+    pileup_file = tmp_path / 'reads.pileup'
+    pileup_file.write_text(''.join(lines))
+    return str(bed_file), str(pileup_file)
+
+
+def test_parallel_histograms_match_serial(tmp_path):
+    bed_file, pileup_file = write_data(tmp_path)
+    bed_dict = deliverable4.parse_bed_data(deliverable4.read_data(bed_file))
+
+    serial = deliverable4.parse_pileup_data(deliverable4.stream_data(pileup_file), bed_dict,
+                                            progress=False, histograms=True)
+    expected = deliverable4.calculate_coverage_distribution(serial)
+    for reader in ('stream', 'mmap'):
+        parallel = deliverable4.parse_pileup_parallel(pileup_file, bed_dict, 3,
+                                                      reader=reader, histograms=True)
+        assert deliverable4.calculate_coverage_distribution(parallel) == expected
+
+    values = deliverable4.parse_pileup_data(deliverable4.stream_data(pileup_file), bed_dict,
+                                            progress=False)
+    assert deliverable4.calculate_coverage_distribution(values) == expected
+
+
+def test_merge_keeps_first_values():
+    first = deliverable4.GeneCoverage(8)
+    second = deliverable4.GeneCoverage(8)
+    for slot, coverage in ((1, 10), (2, 20), (6, 60)):
+        first.add(slot, coverage)
+    for slot, coverage in ((0, 5), (2, 99), (3, 30), (4, 40), (7, 70)):
+        second.add(slot, coverage)
+
+    first.merge(second)
+
+    assert first.values.tolist() == [5, 10, 20, 30, 40, 0, 60, 70]
+    assert list(first.filled) == [1, 1, 1, 1, 1, 0, 1, 1]
+    assert len(first) == 7
+
+
+def test_count_below_threshold_boundary():
+    coverage = deliverable4.GeneCoverage(6)
+    for slot, value in ((0, 29), (1, 30), (2, 31), (4, 0)):
+        coverage.add(slot, value)
+    histogram = deliverable4.CoverageHistogram.from_values(coverage)
+
+    # Only values strictly below the threshold count, empty slots never do
+    for counted in (coverage, histogram, coverage.tolist()):
+        assert deliverable4.calculate_mapping_coverage({'G': counted})[0][3] == 2
+    assert coverage.count_below(30) == histogram.count_below(30) == 2
+    assert coverage.count_below(31) == histogram.count_below(31) == 3
+    assert coverage.count_below(0) == histogram.count_below(0) == 0
@@ -0,0 +1,26 @@
+import deliverable5
+
+
+def write_vcf(path, positions):
+    """ Writes a single-sample VCF file with a record per (chrom, pos, freq) """
+    lines = ['##fileformat=VCFv4.1\n',
+             '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS0\n']
+    lines += ['{}\t{}\t.\tA\tG\t.\tPASS\tADP=20\tGT:DP:FREQ\t0/1:40:{}%\n'.format(*record)
+              for record in positions]
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_regions_of_unsorted_vcf(tmp_path):
+    bed_dict = {'1': [(100, 200, 'A')], '2': [(50, 60, 'B')]}
+    records = [('chr2', 55, 80), ('chr1', 150, 90), ('chr1', 120, 70),
+               ('chr1', 250, 95), ('chr2', 58, 10), ('chr1', 199, 50)]
+    vcf_file = write_vcf(tmp_path / 'unsorted.vcf', records)
+    output_file = tmp_path / 'filtered.vcf'
+
+    counts = deliverable5.parse_vcf_data(vcf_file, 30, str(output_file), bed_dict=bed_dict)
+
+    assert counts == {'records': 5, 'passed': 4}
+    positions = [line.split('\t')[1] for line in output_file.read_text().splitlines()
+                 if not line.startswith('#')]
+    assert positions == ['55', '150', '120', '199']
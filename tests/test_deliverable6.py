@@ -0,0 +1,11 @@
+import pytest
+
+import deliverable6
+
+
+def test_resolve_columns_ignores_case():
+    header = ['Chromosome', 'Begin', 'dbSNP138', 'LJB2_SIFT', 'Begin']
+    columns = ['begin', 'DBSNP138', 3, 'ljb2_sift']
+    assert deliverable6.resolve_columns(header, columns) == [1, 2, 3, 3]
+    with pytest.raises(ValueError):
+        deliverable6.resolve_columns(header, ['clinvar'])